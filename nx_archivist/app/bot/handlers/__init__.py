@@ -1,4 +1,5 @@
 from .search import search_router
 from .auth import auth_router
+from .library import library_router
 
-__all__ = ["search_router", "auth_router"]
+__all__ = ["search_router", "auth_router", "library_router"]
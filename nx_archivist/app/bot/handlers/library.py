@@ -0,0 +1,56 @@
+from aiogram import Router, html
+from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+from app.core.config import config
+from app.services.library import library_search
+import logging
+
+logger = logging.getLogger(__name__)
+
+library_router = Router()
+
+def format_entry(entry: dict) -> str:
+    """
+    HTML message text for an entry; release names often contain [ ] _ * and must be escaped.
+    """
+    total_parts = len(entry["links"])
+    size_str = f"{entry['size'] / (1024**3):.2f} GB" if entry["size"] > 1024**3 else f"{entry['size'] / (1024**2):.1f} MB"
+    lines = [f"📦 {html.bold(html.quote(entry['name']))} ({size_str})"]
+    for i, link in enumerate(entry["links"]):
+        part_suffix = f" - Part {i+1}" if total_parts > 1 else ""
+        lines.append(f"🔹 {html.link(f'Посилання{part_suffix}', html.quote(link))}")
+    return "\n".join(lines)
+
+@library_router.inline_query()
+async def handle_library_query(inline_query: InlineQuery):
+    """
+    `@bot <name or title id>` lists archived files with their channel links, straight from the registry.
+    """
+    query = inline_query.query.strip()
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+
+    entries, next_offset = await library_search.search(query, offset) if query else ([], None)
+
+    results = []
+    for entry in entries:
+        details = [entry["category"] or "", f"{entry['size'] / (1024**3):.2f} GB"]
+        if entry["title_id"]:
+            details.append(f"{entry['title_id']} v{entry['version'] or 0}")
+        if len(entry["links"]) > 1:
+            details.append(f"{len(entry['links'])} частин")
+        results.append(InlineQueryResultArticle(
+            id=str(entry["id"]),
+            title=entry["name"],
+            description=" | ".join(d for d in details if d),
+            input_message_content=InputTextMessageContent(message_text=format_entry(entry), parse_mode="HTML")
+        ))
+
+    try:
+        await inline_query.answer(
+            results,
+            cache_time=config.LIBRARY_CACHE_TTL,
+            is_personal=True,
+            next_offset=str(next_offset) if next_offset is not None else ""
+        )
+    except Exception as e:
+        # Usually the query expired while the registry was searched; nothing to answer anymore
+        logger.warning(f"Could not answer inline query '{query}': {e}")
@@ -3,16 +3,25 @@ from aiogram import Router, F, types
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.filters import Command
 from app.services.rutracker import RuTrackerService
+from app.services.catalog import tracker_catalog
+from app.services.library import library_search
 from app.core.torrent import TorrentManager
+from app.core.torrent_cache import torrent_cache
 from app.core.categorizer import Categorizer
 from app.core.archivist import Archivist
+from app.core.pipeline import PackUploadPipeline
 from app.services.uploader import Uploader
-from app.db.base import async_session
+from app.db.registry_writer import registry_writer
 from app.db.models import FilesRegistry, TelegramStorage
 from app.core.config import config
+from app.utils.storage import storage_ledger
+from app.core.hashing import group_hash
+from app.core.dedup_index import dedup_index
+from sqlalchemy import select, update
 import os
 import logging
-import shutil
+
+logger = logging.getLogger(__name__)
 
 search_router = Router()
 rutracker = RuTrackerService()
@@ -78,22 +87,54 @@ async def handle_search(message: Message):
     
     await message.answer(f"Шукаю '{query}' на RuTracker...", reply_markup=kb_status)
     
-    results = await rutracker.search(query)
+    found = []
+    shown = set()
+
+    async def show(page):
+        found.extend(page)
+        for res in page:
+            if len(shown) >= 15: # Show top 15
+                break
+            shown.add(res["id"])
+            kb = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="Вибрати цей реліз", callback_data=f"select_{res['id']}")]
+            ])
+            await message.answer(
+                f"📦 {res['title']}\n"
+                f"💾 Розмір: {res['size']}\n"
+                f"🌱 Сідів: {res['seeds']}",
+                reply_markup=kb
+            )
+
+    # The local catalog answers without waiting for RuTracker
+    local = await tracker_catalog.search(query)
+    await show(local)
+
+    if not local or config.CATALOG_LIVE_REFRESH:
+        # Show the first results as soon as their page arrives; later pages are fetched meanwhile
+        known = {res["id"] for res in local}
+        try:
+            async for page in rutracker.search_pages(query):
+                if tracker_catalog.enabled:
+                    await tracker_catalog.store(page)
+                await show([res for res in page if res["id"] not in known])
+        except Exception as e:
+            if not local:
+                raise
+            logger.warning(f"Live search for '{query}' failed, catalog results only: {e}")
     
-    if not results:
+    if not found:
         await message.answer("Нічого не знайдено.")
         return
-        
-    for res in results[:15]: # Show top 15
+
+    # The rest of all pages, most seeded first
+    rest = [res for res in RuTrackerService.sort_results(found, by="seeds") if res["id"] not in shown]
+    if rest:
         kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="Вибрати цей реліз", callback_data=f"select_{res['id']}")]
+            [InlineKeyboardButton(text=f"🌱 {res['seeds']} | {res['size']} | {res['title']}"[:64], callback_data=f"select_{res['id']}")]
+            for res in rest[:10]
         ])
-        await message.answer(
-            f"📦 {res['title']}\n"
-            f"💾 Розмір: {res['size']}\n"
-            f"🌱 Сідів: {res['seeds']}",
-            reply_markup=kb
-        )
+        await message.answer(f"Ще {len(rest)} релізів. Найпопулярніші з них:", reply_markup=kb)
 
 @search_router.callback_query(F.data.startswith("select_"))
 async def handle_select_release(callback: CallbackQuery):
@@ -148,8 +189,7 @@ async def handle_download(callback: CallbackQuery):
         await callback.answer("Не вдалося отримати торрент-файл.", show_alert=True)
         return
         
-    import libtorrent as lt
-    info = lt.torrent_info(lt.bdecode(torrent_data))
+    info = torrent_cache.get_info(torrent_data)
     task_name = info.name()
     
     # 2. Create task
@@ -168,17 +208,121 @@ async def handle_download(callback: CallbackQuery):
     )
     await callback.answer()
 
+def group_title(group: dict, name: str):
+    """
+    (title_id, version) of a registry entry: read from the downloaded file's header
+    by process_group when available, otherwise parsed from the name.
+    """
+    title = group.get("titles", {}).get(name.replace(os.sep, "/"))
+    return title or Categorizer.parse_title(name)
+
+async def register_part(session, record: dict, group: dict, archive_name: str, index: int, link: str):
+    """
+    Stores the link of one uploaded part as soon as it is in the channel.
+    The group row is created with the first part; total_parts stays NULL until
+    `finalize_group`, which marks the upload as complete.
+    """
+    # A failed batch is rolled back, so an id remembered from it may not exist
+    if record.get("file_id") is None or await session.get(FilesRegistry, record["file_id"]) is None:
+        title_id, version = group_title(group, group["name"])
+        new_file = FilesRegistry(
+            file_original_name=group["name"],
+            file_size=record["size"],
+            category=group["category"],
+            title_id=title_id,
+            version=version
+        )
+        session.add(new_file)
+        await session.flush()
+        record["file_id"] = new_file.id
+
+    session.add(TelegramStorage(
+        file_id=record["file_id"],
+        telegram_message_link=link,
+        archive_obfuscated_name=archive_name,
+        part_number=index+1
+    ))
+
+async def finalize_group(session, record: dict, group: dict, total_size: int, archive_name: str, uploaded: list, file_hashes: dict):
+    """
+    Completes a group registered part by part and, for multi-file groups, registers each member file.
+    Every registry row links to all archive parts; file_hash holds the SHA-256
+    computed while packing (for groups, a hash over the member hashes).
+    Returns the registered (name, size, file_hash, title_id, version) entries.
+    """
+    if record.get("file_id") is None:
+        raise RuntimeError(f"Parts of {group['name']} were not registered")
+    members = sorted(
+        # Same separators as the torrent paths check_deduplication compares against
+        (os.path.relpath(path, config.DOWNLOAD_DIR).replace(os.sep, "/"), digest, size)
+        for path, (digest, size) in file_hashes.items()
+    )
+    if len(members) == 1:
+        entries = [(group["name"], total_size, members[0][1])]
+    else:
+        entries = [(group["name"], total_size, group_hash((name, digest) for name, digest, _ in members) if members else None)]
+        entries += [(name, size, digest) for name, digest, size in members]
+
+    total_parts = len(uploaded)
+    registered = []
+    for n, (name, size, digest) in enumerate(entries):
+        # file_hash is unique: identical content may already be registered under another name
+        if digest:
+            existing = await session.execute(select(FilesRegistry.id).where(FilesRegistry.file_hash == digest))
+            if existing.first():
+                logger.info(f"Content of {name} already registered (sha256 {digest[:12]}...)")
+                digest = None
+
+        if n == 0:
+            await session.execute(
+                update(FilesRegistry).where(FilesRegistry.id == record["file_id"]).values(file_hash=digest)
+            )
+            await session.execute(
+                update(TelegramStorage)
+                .where(TelegramStorage.file_id == record["file_id"])
+                .values(is_parted=total_parts > 1, total_parts=total_parts)
+            )
+            registered.append((name, size, digest, *group_title(group, name)))
+            continue
+
+        title_id, version = group_title(group, name)
+        new_file = FilesRegistry(
+            file_original_name=name,
+            file_size=size,
+            file_hash=digest,
+            category=group["category"],
+            title_id=title_id,
+            version=version
+        )
+        session.add(new_file)
+        await session.flush()
+        
+        for i, part, link in uploaded:
+            session.add(TelegramStorage(
+                file_id=new_file.id,
+                telegram_message_link=link,
+                archive_obfuscated_name=archive_name,
+                is_parted=total_parts > 1,
+                part_number=i+1,
+                total_parts=total_parts
+            ))
+        registered.append((name, size, digest, title_id, version))
+    return registered
+
 async def process_download_task(task_id: str, topic_id: str, chat_id: int):
     from app.core.tasks import task_manager, TaskStatus
     import main as main_module
     from main import logger
     
     bot = main_module.bot_instance
+    handle = None
 
     try:
         # 1. Get torrent and handle
         torrent_data = await rutracker.get_torrent_file(topic_id)
         handle = await torrent_manager.add_torrent(torrent_data, config.DOWNLOAD_DIR)
+        # Lets a restart pick this task up again
+        torrent_manager.remember_task(handle, topic_id, chat_id, task_manager.tasks[task_id].name)
         
         # 2. Check which files to download
         files_status = await torrent_manager.check_deduplication(handle)
@@ -193,33 +337,32 @@ async def process_download_task(task_id: str, topic_id: str, chat_id: int):
                     all_to_download.append(f["index"])
         
         if not all_to_download:
+            torrent_manager.release(handle)
             task_manager.update_task(task_id, status=TaskStatus.COMPLETED, progress=100.0)
             if bot: await bot.send_message(chat_id, f"✅ Завдання `{task_id}` завершено: всі файли вже в базі.")
             return
             
-        # 3. Download
-        await torrent_manager.start_selective_download(handle, all_to_download, task_id=task_id)
-        
-        if bot:
-            await bot.send_message(chat_id, f"✅ Завантаження `{task_id}` завершено. Починаю архівацію та вивантаження...")
-        
-        # 4. Packing & Uploading
-        task_manager.update_task(task_id, status=TaskStatus.PACKING, progress=0.0)
+        # Reserve the worst case up front: downloaded files plus archive parts of the same size
+        download_size = sum(f["size"] for f in files_status if not f["exists"])
+        footprint = download_size * 2
+        if not storage_ledger.can_reserve(footprint) and bot:
+            await bot.send_message(chat_id, f"⏳ Завдання `{task_id}` чекає на вільне місце ({footprint / (1024**3):.1f} GB).")
+        await storage_ledger.reserve(task_id, footprint)
+            
+        # 3. Plan processing groups up front so each can be packed as soon as its files are done
         final_links = []
         
         # Group entities by category
         categories = {"Base": [], "Update": [], "DLC": [], "Other": []}
-        for entity in files_status:
-            if entity["exists"]:
-                continue
-            
-            path = ""
+        pending_entities = [entity for entity in files_status if not entity["exists"]]
+        paths = []
+        for entity in pending_entities:
             if entity.get("is_folder"):
-                path = os.path.join(config.DOWNLOAD_DIR, entity["name"])
+                paths.append(os.path.join(config.DOWNLOAD_DIR, entity["name"]))
             else:
-                path = torrent_manager.get_file_path(handle, entity["index"])
+                paths.append(torrent_manager.get_file_path(handle, entity["index"]))
             
-            cat = Categorizer.categorize(path)
+        for entity, cat in zip(pending_entities, Categorizer.categorize_many(paths)):
             if cat not in categories: cat = "Other"
             categories[cat].append(entity)
 
@@ -240,78 +383,193 @@ async def process_download_task(task_id: str, topic_id: str, chat_id: int):
                         "category": cat
                     })
 
-        async with async_session() as session:
-            for group in processing_groups:
-                source_paths = []
-                total_size = 0
-                for ent in group["entities"]:
-                    if ent.get("is_folder"):
-                        source_paths.append(os.path.join(config.DOWNLOAD_DIR, ent["name"]))
-                    else:
-                        source_paths.append(torrent_manager.get_file_path(handle, ent["index"]))
-                    total_size += ent["size"]
-
-                archive_name = Archivist.generate_obfuscated_name()
-                
-                def packing_progress(p):
-                    task_manager.update_task(task_id, progress=p)
-
-                # Run CPU-bound packing in a separate thread to keep bot responsive
-                parts = await asyncio.to_thread(
-                    Archivist.pack_and_split,
-                    source_paths, 
-                    config.DOWNLOAD_DIR, 
-                    archive_name,
-                    progress_callback=packing_progress
-                )
-                
-                # 5. Upload parts
-                for i, part in enumerate(parts):
+        # Groups are packed concurrently in the packing pool; progress is weighted by group size
+        group_progress = {}
+        group_weights = {}
+        group_pending = {}
+        packing_slots = asyncio.Semaphore(max(config.PACKING_WORKERS, 1))
+        upload_lock = asyncio.Lock()
+        download_done = False
+
+        def report_packing_progress():
+            # While the torrent is still running the task shows download progress
+            total_weight = sum(group_weights.values())
+            if download_done and total_weight > 0:
+                progress = sum(group_progress[k] * group_weights[k] for k in group_progress) / total_weight
+                task_manager.update_task(task_id, progress=progress)
+        async def process_group(group_idx: int, group: dict):
+            # Only the planned files: a folder may hold subfolders that are groups of their own
+            source_paths = []
+            folders = []
+            total_size = 0
+            for ent in group["entities"]:
+                if ent.get("is_folder"):
+                    folder = os.path.join(config.DOWNLOAD_DIR, ent["name"])
+                    folders.append(folder)
+                    for idx in ent["indices"]:
+                        path = torrent_manager.get_file_path(handle, idx)
+                        source_paths.append((path, os.path.relpath(path, os.path.dirname(folder))))
+                else:
+                    source_paths.append(torrent_manager.get_file_path(handle, ent["index"]))
+                total_size += ent["size"]
+
+            # The files are complete now: identify them by their container headers, not their names
+            member_paths = [source[0] if isinstance(source, tuple) else source for source in source_paths]
+            group["titles"] = await asyncio.to_thread(lambda: {
+                os.path.relpath(path, config.DOWNLOAD_DIR).replace(os.sep, "/"): Categorizer.read_title(path)
+                for path in member_paths
+            })
+            if len(group["entities"]) == 1 and not group["entities"][0].get("is_folder"):
+                category = (await asyncio.to_thread(Categorizer.categorize_many, member_paths))[0]
+                group["category"] = category if category in categories else "Other"
+
+            archive_name = Archivist.generate_obfuscated_name()
+            file_hashes = {}
+            record = {"size": total_size, "file_id": None}
+
+            def on_file_hashed(path: str, digest: str):
+                file_hashes[path] = (digest, os.path.getsize(path))
+            
+            def packing_progress(p):
+                group_progress[group_idx] = p
+                report_packing_progress()
+
+            async def upload_part(part: str) -> str:
+                storage_ledger.record(task_id, os.path.getsize(part))
+                # One upload at a time per task, as before
+                async with upload_lock:
                     # No caption as requested
                     link = await uploader.upload_file(part, task_id=task_id)
-                    
-                    # Save to DB
-                    new_file = FilesRegistry(
-                        file_original_name=group["name"],
-                        file_size=total_size,
-                        file_hash=None, # Hash is complex for groups
-                        category=group["category"]
-                    )
-                    session.add(new_file)
-                    await session.flush()
-                    
-                    new_storage = TelegramStorage(
-                        file_id=new_file.id,
-                        telegram_message_link=link,
-                        archive_obfuscated_name=archive_name,
-                        is_parted=len(parts) > 1,
-                        part_number=i+1,
-                        total_parts=len(parts)
-                    )
-                    session.add(new_storage)
-                    
-                    # Add to final links for user
-                    part_suffix = f" - Part {i+1}" if len(parts) > 1 else ""
-                    final_links.append(f"🔹 **{group['name']}{part_suffix}**: [Посилання]({link})")
-                
-                # Cleanup
                 if config.DELETE_AFTER_UPLOAD:
-                    for path in source_paths:
-                        try:
-                            if os.path.isdir(path): shutil.rmtree(path)
-                            else: os.remove(path)
-                        except Exception as e: logger.error(f"Cleanup error: {e}")
-            
-            await session.commit()
+                    try:
+                        storage_ledger.record_removal(task_id, part)
+                        os.remove(part)
+                    except Exception as e: logger.error(f"Cleanup error: {e}")
+                return link
+
+            part_writes = []
+
+            def on_part_uploaded(index: int, part: str, link: str):
+                # Committed right away so a crash later in the task keeps the link
+                part_writes.append(registry_writer.submit(
+                    lambda session: register_part(session, record, group, archive_name, index, link)
+                ))
+
+            # Pack in the packing pool and upload each volume as soon as it is closed
+            async with packing_slots:
+                pipeline = PackUploadPipeline(upload_part)
+                uploaded = await pipeline.run(
+                    source_paths,
+                    config.DOWNLOAD_DIR,
+                    archive_name,
+                    progress_callback=packing_progress,
+                    hash_callback=on_file_hashed,
+                    uploaded_callback=on_part_uploaded
+                )
+            # A part that could not be stored fails the task instead of leaving the group without a row
+            await asyncio.gather(*part_writes)
+            registered = await registry_writer.submit(
+                lambda session: finalize_group(session, record, group, total_size, archive_name, uploaded, file_hashes)
+            )
+            for name, size, digest, title_id, version in registered:
+                dedup_index.add_entry(name, size, uploaded[0][2], title_id, version)
+            library_search.invalidate()
+            group_progress[group_idx] = 100.0
             
+            # Cleanup
+            if config.DELETE_AFTER_UPLOAD:
+                for source in source_paths:
+                    path = source[0] if isinstance(source, tuple) else source
+                    try:
+                        storage_ledger.record_removal(task_id, path)
+                        os.remove(path)
+                    except Exception as e: logger.error(f"Cleanup error: {e}")
+                for folder in folders:
+                    # Left in place while other groups still have files inside
+                    try: os.rmdir(folder)
+                    except OSError: pass
+
+            return uploaded
+
+        # Smaller groups get higher file priorities so they finish (and start packing) first
+        file_priorities = {}
+        by_size = sorted(range(len(processing_groups)), key=lambda i: sum(ent["size"] for ent in processing_groups[i]["entities"]))
+        for rank, group_idx in enumerate(by_size):
+            group = processing_groups[group_idx]
+            group_progress[group_idx] = 0.0
+            group_weights[group_idx] = max(sum(ent["size"] for ent in group["entities"]), 1)
+            group_pending[group_idx] = set()
+            for ent in group["entities"]:
+                group_pending[group_idx].update(ent["indices"] if ent.get("is_folder") else [ent["index"]])
+            priority = 7 - (rank * 6) // max(len(by_size) - 1, 1)
+            for idx in group_pending[group_idx]:
+                file_priorities[idx] = priority
+
+        # 4. Download, dispatching every group to packing & uploading once all of its files are complete
+        group_tasks = {}
+        file_to_group = {idx: g for g, indices in group_pending.items() for idx in indices}
+        try:
+            async for idx in torrent_manager.iter_completed_files(handle, all_to_download, task_id=task_id, priorities=file_priorities):
+                storage_ledger.record_file(task_id, torrent_manager.get_file_path(handle, idx), handle.get_torrent_info().file_at(idx).size)
+                group_idx = file_to_group.get(idx)
+                if group_idx is None:
+                    continue
+                group_pending[group_idx].discard(idx)
+                if not group_pending[group_idx] and group_idx not in group_tasks:
+                    logger.info(f"[{task_id}] Files of '{processing_groups[group_idx]['name']}' complete, packing")
+                    group_tasks[group_idx] = asyncio.create_task(process_group(group_idx, processing_groups[group_idx]))
+        except BaseException:
+            for t in group_tasks.values():
+                t.cancel()
+            await asyncio.gather(*group_tasks.values(), return_exceptions=True)
+            raise
+
+        # Every wanted file is on disk now; start anything the stream did not dispatch
+        for group_idx, group in enumerate(processing_groups):
+            if group_idx not in group_tasks:
+                group_tasks[group_idx] = asyncio.create_task(process_group(group_idx, group))
+
+        download_done = True
+        task_manager.update_task(task_id, status=TaskStatus.PACKING)
+        report_packing_progress()
+        if bot:
+            await bot.send_message(chat_id, f"✅ Завантаження `{task_id}` завершено. Завершую архівацію та вивантаження...")
+
+        try:
+            results = await asyncio.gather(*(group_tasks[i] for i in range(len(processing_groups))))
+        except BaseException:
+            # One group failed: stop the others before the task is marked failed
+            for t in group_tasks.values():
+                t.cancel()
+            await asyncio.gather(*group_tasks.values(), return_exceptions=True)
+            raise
+
+        # 5. Every group is already registered; add to final links for user
+        for group, uploaded in zip(processing_groups, results):
+            total_parts = len(uploaded)
+            for i, part, link in uploaded:
+                part_suffix = f" - Part {i+1}" if total_parts > 1 else ""
+                final_links.append(f"🔹 **{group['name']}{part_suffix}**: [Посилання]({link})")
+
+        torrent_manager.release(handle)
         task_manager.update_task(task_id, status=TaskStatus.COMPLETED, progress=100.0)
         response = f"✨ **Завдання `{task_id}` завершено!**\n\n" + "\n".join(final_links)
         if bot: await bot.send_message(chat_id, response, parse_mode="Markdown")
 
+    except asyncio.CancelledError:
+        # Shutdown keeps the resume data so the task restarts with the bot
+        if handle is not None and not torrent_manager.shutting_down:
+            torrent_manager.release(handle)
+        task_manager.update_task(task_id, status=TaskStatus.FAILED, error="Скасовано")
+        raise
     except Exception as e:
         logger.exception(f"Error in task {task_id}: {e}")
+        if handle is not None:
+            torrent_manager.release(handle)
         task_manager.update_task(task_id, status=TaskStatus.FAILED, error=str(e))
         if bot: await bot.send_message(chat_id, f"❌ Помилка у завданні `{task_id}`: {e}")
+    finally:
+        storage_ledger.release(task_id)
 
 @search_router.callback_query(F.data == "check_status")
 async def handle_check_status(callback: CallbackQuery):
@@ -4,8 +4,11 @@ import secrets
 import string
 import logging
 import asyncio
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
 from app.core.config import config
+from app.core.volumes import VolumeWriter, split_file
+from app.core.compression import CompressionPolicy
+from app.core.hashing import HashingReader
 
 logger = logging.getLogger(__name__)
 
@@ -15,32 +18,24 @@ class Archivist:
         alphabet = string.ascii_letters + string.digits
         return ''.join(secrets.choice(alphabet) for _ in range(length))
 
-    @classmethod
-    def pack_and_split(cls, 
-                       source_files: List[str], 
-                       output_dir: str, 
-                       archive_name: Optional[str] = None,
-                       progress_callback: Optional[callable] = None) -> List[str]:
+    @staticmethod
+    def get_split_size() -> int:
+        limit_gb = 3.9 if config.IS_TELEGRAM_PREMIUM else 1.9
+        return int(limit_gb * 1024 * 1024 * 1024)
+
+    @staticmethod
+    def collect_files(source_files: List[Union[str, Tuple[str, str]]]) -> Tuple[List[Tuple[str, str]], int]:
         """
-        Packs files into a 7z archive with AES-256 encryption and splits it if necessary.
+        Expands folders into (full_path, arcname) pairs and returns them with their total size.
+        Entries that already are (full_path, arcname) pairs are taken as they are.
         """
-        if not archive_name:
-            archive_name = cls.generate_obfuscated_name()
-            
-        archive_path = os.path.join(output_dir, f"{archive_name}.7z")
-        password = config.ENCRYPTION_PASSWORD
-        
-        # Determine split size
-        limit_gb = 3.9 if config.IS_TELEGRAM_PREMIUM else 1.9
-        split_size = int(limit_gb * 1024 * 1024 * 1024)
-        
-        logger.info(f"Packing 7z archive with AES-256. Premium: {config.IS_TELEGRAM_PREMIUM}, Limit: {limit_gb}GB")
-        
-        # Calculate total size for progress reporting
         total_size = 0
         all_files = []
         for f in source_files:
-            if os.path.isdir(f):
+            if isinstance(f, tuple):
+                all_files.append(f)
+                total_size += os.path.getsize(f[0])
+            elif os.path.isdir(f):
                 for root, dirs, files in os.walk(f):
                     for file in files:
                         p = os.path.join(root, file)
@@ -49,19 +44,120 @@ class Archivist:
             else:
                 all_files.append((f, os.path.basename(f)))
                 total_size += os.path.getsize(f)
+        return all_files, total_size
 
-        current_size = 0
-        filters = [{"id": py7zr.FILTER_LZMA2, "preset": 9}]
+    @classmethod
+    def pack_and_split(cls, 
+                       source_files: List[Union[str, Tuple[str, str]]], 
+                       output_dir: str, 
+                       archive_name: Optional[str] = None,
+                       progress_callback: Optional[callable] = None,
+                       streaming: Optional[bool] = None,
+                       volume_callback: Optional[callable] = None,
+                       hash_callback: Optional[callable] = None) -> List[str]:
+        """
+        Packs files into a 7z archive with AES-256 encryption and splits it if necessary.
+        In streaming mode py7zr writes directly into rolling volumes, otherwise the
+        whole archive is written first and then split into parts.
+        `volume_callback(index, path)` is called for every part once it is final.
+        `hash_callback(path, sha256)` receives the digest of every source file,
+        computed from the same read that feeds the compressor.
+        """
+        if not archive_name:
+            archive_name = cls.generate_obfuscated_name()
+        if streaming is None:
+            streaming = config.ARCHIVE_STREAMING_VOLUMES
+            
+        archive_path = os.path.join(output_dir, f"{archive_name}.7z")
+        split_size = cls.get_split_size()
+        
+        logger.info(f"Packing 7z archive with AES-256. Premium: {config.IS_TELEGRAM_PREMIUM}, Limit: {split_size / (1024**3):.1f}GB, Streaming: {streaming}")
         
-        with py7zr.SevenZipFile(archive_path, 'w', password=password, filters=filters) as archive:
-            for full_path, arcname in all_files:
-                logger.info(f"Adding to archive: {arcname} ({os.path.getsize(full_path) / (1024**2):.1f} MB)")
-                archive.write(full_path, arcname=arcname)
-                current_size += os.path.getsize(full_path)
-                if progress_callback and total_size > 0:
-                    # Packing is first 50% of the process
-                    progress = (current_size / total_size) * 50
-                    progress_callback(progress)
+        all_files, total_size = cls.collect_files(source_files)
+        policy, filters = CompressionPolicy.choose(all_files, forced=config.COMPRESSION_POLICY)
+        logger.info(f"Compression policy: {policy} ({total_size / (1024**2):.1f} MB input)")
+
+        packed_size = 0
+
+        def on_volume(index: int, path: str):
+            nonlocal packed_size
+            packed_size += os.path.getsize(path)
+            if volume_callback:
+                volume_callback(index, path)
+
+        if streaming:
+            parts = cls._pack_streaming(all_files, total_size, archive_path, split_size, filters, progress_callback, on_volume, hash_callback)
+        else:
+            parts = cls._pack_then_split(all_files, total_size, archive_path, split_size, filters, progress_callback, hash_callback)
+            for index, part in enumerate(parts):
+                on_volume(index, part)
+
+        if total_size > 0:
+            logger.info(f"Compression policy {policy}: {total_size / (1024**2):.1f} MB -> {packed_size / (1024**2):.1f} MB (ratio {packed_size / total_size:.3f})")
+        return parts
+
+    @staticmethod
+    def _write_members(archive: py7zr.SevenZipFile,
+                       all_files: List[Tuple[str, str]],
+                       total_size: int,
+                       progress_callback: Optional[callable],
+                       progress_share: float,
+                       hash_callback: Optional[callable] = None):
+        current_size = 0
+        for full_path, arcname in all_files:
+            logger.info(f"Adding to archive: {arcname} ({os.path.getsize(full_path) / (1024**2):.1f} MB)")
+            # Hash while py7zr reads the file, so the content is read only once
+            with open(full_path, 'rb') as f:
+                reader = HashingReader(f)
+                archive.writef(reader, arcname)
+            if hash_callback:
+                hash_callback(full_path, reader.hexdigest())
+            current_size += os.path.getsize(full_path)
+            if progress_callback and total_size > 0:
+                progress = (current_size / total_size) * progress_share
+                progress_callback(min(progress, 99.9))
+
+    @classmethod
+    def _pack_streaming(cls,
+                        all_files: List[Tuple[str, str]],
+                        total_size: int,
+                        archive_path: str,
+                        split_size: int,
+                        filters: List[dict],
+                        progress_callback: Optional[callable],
+                        volume_callback: Optional[callable] = None,
+                       hash_callback: Optional[callable] = None) -> List[str]:
+        def on_volume_closed(index: int, path: str):
+            logger.info(f"Created part {index + 1}: {path} ({os.path.getsize(path) / (1024**2):.1f} MB)")
+            if volume_callback:
+                volume_callback(index, path)
+
+        writer = VolumeWriter(archive_path, split_size, on_volume_closed=on_volume_closed)
+        try:
+            with py7zr.SevenZipFile(writer, 'w', password=config.ENCRYPTION_PASSWORD, header_encryption=True, filters=filters) as archive:
+                cls._write_members(archive, all_files, total_size, progress_callback, 100, hash_callback)
+        except Exception:
+            writer.close()
+            for path in writer.volumes:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+        logger.info(f"7z Archive created. Total size: {writer.size / (1024**2):.1f} MB")
+        return writer.finalize(single_path=archive_path)
+
+    @classmethod
+    def _pack_then_split(cls,
+                         all_files: List[Tuple[str, str]],
+                         total_size: int,
+                         archive_path: str,
+                         split_size: int,
+                         filters: List[dict],
+                         progress_callback: Optional[callable],
+                         hash_callback: Optional[callable] = None) -> List[str]:
+        with py7zr.SevenZipFile(archive_path, 'w', password=config.ENCRYPTION_PASSWORD, header_encryption=True, filters=filters) as archive:
+            # Packing is first 50% of the process
+            cls._write_members(archive, all_files, total_size, progress_callback, 50, hash_callback)
                 
         # Splitting logic (if file size > split_size)
         file_size = os.path.getsize(archive_path)
@@ -70,27 +166,14 @@ class Archivist:
         if file_size <= split_size:
             return [archive_path]
             
-        # Split the file
-        parts = []
-        with open(archive_path, 'rb') as f:
-            part_num = 1
-            while True:
-                chunk = f.read(split_size)
-                if not chunk:
-                    break
-                part_path = f"{archive_path}.{part_num:03d}"
-                with open(part_path, 'wb') as part_file:
-                    part_file.write(chunk)
-                
-                logger.info(f"Created part {part_num}: {part_path} ({os.path.getsize(part_path) / (1024**2):.1f} MB)")
-                parts.append(part_path)
-                
-                if progress_callback and file_size > 0:
-                    # Splitting is the second 50%
-                    progress = 50 + (part_num * split_size / file_size) * 50
-                    progress_callback(min(progress, 99.9))
-                
-                part_num += 1
+        # Split the file with bounded memory; splitting is the second 50%
+        def split_progress(done: int, total: int):
+            if progress_callback and total > 0:
+                progress_callback(min(50 + (done / total) * 50, 99.9))
+
+        parts = split_file(archive_path, split_size, progress_callback=split_progress)
+        for part_num, part_path in enumerate(parts, 1):
+            logger.info(f"Created part {part_num}: {part_path} ({os.path.getsize(part_path) / (1024**2):.1f} MB)")
                 
         # Remove the original large archive
         os.remove(archive_path)
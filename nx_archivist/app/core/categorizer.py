@@ -1,36 +1,98 @@
+import os
 import re
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+from app.core.containers import ContainerReader
 
 class Categorizer:
-    # Common patterns for Switch files
-    BASE_PATTERN = re.compile(r"\[0100[0-9A-F]{8}000\]", re.IGNORECASE)
-    UPDATE_PATTERN = re.compile(r"\[0100[0-9A-F]{8}[0-9A-F]{3}[1-9A-F]000\]", re.IGNORECASE) # Simplified
-    DLC_PATTERN = re.compile(r"\[0100[0-9A-F]{8}[0-9A-F]{3}[0-9A-F][1-9A-F]00\]", re.IGNORECASE) # Simplified
+    # Keywords are plain substring checks; only the Title ID needs a regex
+    TITLE_ID_PATTERN = re.compile(r"\[(01[0-9a-f]{14})\]")
+    VERSION_PATTERN = re.compile(r"(?<![0-9a-z])v(\d+)(?![0-9a-z.])", re.IGNORECASE)  # [v65536], v131072
+    MEMO_SIZE = 65536
     
-    # Better patterns based on Title ID structure
-    # Base: [TitleID] where TitleID ends in 000
-    # Update: [TitleID] where TitleID ends in 800, 1000, etc.
-    # DLC: [TitleID] where TitleID is between Base and Update
+    # Title ID structure: Base ends in 000, Update in 800, DLC anything else
     
+    @staticmethod
+    @lru_cache(maxsize=MEMO_SIZE)
+    def _scan(filename: str) -> Tuple[str, Optional[str]]:
+        """
+        Classifies a name and extracts its Title ID from one lowercased copy. Memoized per name.
+        """
+        name = filename.lower()
+        match = Categorizer.TITLE_ID_PATTERN.search(name)
+        title_id = match.group(1).upper() if match else None
+
+        # Keywords win over the Title ID, as before
+        if "update" in name or "v65536" in name or "v131072" in name:
+            return "Update", title_id
+        if "dlc" in name:
+            return "DLC", title_id
+        if title_id:
+            low = title_id[-3:]
+            return "Base" if low == "000" else "Update" if low == "800" else "DLC", title_id
+        return "Unknown", None
+
     @classmethod
     def categorize(cls, filename: str) -> str:
-        filename_lower = filename.lower()
-        
-        # Simple keyword check first
-        if "update" in filename_lower or "v65536" in filename_lower or "v131072" in filename_lower:
-            return "Update"
-        if "dlc" in filename_lower:
-            return "DLC"
-            
-        # Regex check
-        if cls.UPDATE_PATTERN.search(filename):
-            return "Update"
-        if cls.DLC_PATTERN.search(filename):
-            return "DLC"
-        if cls.BASE_PATTERN.search(filename):
-            return "Base"
-            
-        return "Unknown"
+        # Files already on disk are identified from their container header
+        meta = ContainerReader.read(filename)
+        if meta and meta["content_type"]:
+            return meta["content_type"]
+        return cls._scan(filename)[0]
+
+    @classmethod
+    def categorize_many(cls, filenames: List[str]) -> List[str]:
+        """
+        Categorizes a batch of names in order; repeated names are classified once.
+        Each directory is listed once so headers are only read for files that exist.
+        """
+        unique = set(filenames)
+        existing = set()
+        for dirname in {os.path.dirname(f) for f in unique}:
+            try:
+                with os.scandir(dirname or ".") as it:
+                    existing.update(os.path.join(dirname, entry.name) for entry in it if entry.is_file())
+            except OSError:
+                pass
+
+        # Header types of the files on disk; everything else is classified by name
+        header_types = {}
+        for f in unique & existing:
+            meta = ContainerReader.read(f)
+            if meta and meta["content_type"]:
+                header_types[f] = meta["content_type"]
+
+        scan = cls._scan
+        return [header_types.get(f) or scan(f)[0] for f in filenames]
+
+    @classmethod
+    def parse_title(cls, filename: str) -> Tuple[Optional[str], Optional[int]]:
+        """
+        Returns (title_id, version) from a release file name; either may be None.
+        """
+        name = os.path.basename(filename)
+        version = cls.VERSION_PATTERN.search(name)
+        return (
+            cls._scan(name)[1],
+            int(version.group(1)) if version else None
+        )
+
+    @classmethod
+    def read_title(cls, path: str) -> Tuple[Optional[str], Optional[int]]:
+        """
+        Returns (title_id, version) of a file on disk from its container header,
+        falling back to its name for whatever the header does not carry.
+        """
+        title_id, version = cls.parse_title(path)
+        meta = ContainerReader.read(path)
+        if meta:
+            title_id = meta["title_id"] or title_id
+            version = meta["version"] if meta["version"] is not None else version
+        return title_id, version
+
+    @classmethod
+    def memo_info(cls):
+        return cls._scan.cache_info()
 
     @classmethod
     def group_dlcs(cls, files: List[str], threshold: int = 5) -> Dict[str, List[str]]:
@@ -38,8 +100,7 @@ class Categorizer:
         Groups files into categories. If DLC count > threshold, they are grouped.
         """
         categories = {"Base": [], "Update": [], "DLC": [], "Unknown": []}
-        for f in files:
-            cat = cls.categorize(f)
+        for f, cat in zip(files, cls.categorize_many(files)):
             categories[cat].append(f)
             
         return categories
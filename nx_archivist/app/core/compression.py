@@ -0,0 +1,112 @@
+import os
+import math
+import zlib
+import logging
+import py7zr
+from collections import Counter
+from typing import List, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+class CompressionPolicy:
+    """
+    Picks the 7z filter chain for an archive from a cheap look at its inputs.
+    Every chain ends with AES-256, so the policy only changes the compression step.
+    """
+    STORE = "store"
+    FAST = "fast"
+    MAX = "max"
+
+    AES = {"id": py7zr.FILTER_CRYPTO_AES256_SHA256}
+    FILTERS = {
+        STORE: [{"id": py7zr.FILTER_COPY}, AES],
+        FAST: [{"id": py7zr.FILTER_LZMA2, "preset": 1}, AES],
+        MAX: [{"id": py7zr.FILTER_LZMA2, "preset": 9}, AES],
+    }
+
+    # Switch containers are encrypted (NSP/XCI) or already compressed (NSZ/XCZ)
+    INCOMPRESSIBLE_EXTENSIONS = {
+        ".nsp", ".xci", ".nsz", ".xcz", ".nca", ".ncz",
+        ".7z", ".zip", ".rar", ".gz", ".xz", ".zst", ".bz2",
+        ".jpg", ".jpeg", ".png", ".mp4", ".mkv",
+    }
+
+    SAMPLE_BLOCKS = 4
+    SAMPLE_BLOCK_SIZE = 64 * 1024
+    # Entropy (bits/byte) above which a block is considered random
+    HIGH_ENTROPY = 7.9
+    # zlib ratio of the samples above which LZMA2 preset 9 is not worth it
+    POOR_RATIO = 0.9
+    # Share of incompressible bytes above which the whole archive is stored
+    STORE_SHARE = 0.9
+
+    @staticmethod
+    def entropy(data: bytes) -> float:
+        if not data:
+            return 0.0
+        total = len(data)
+        return -sum(c / total * math.log2(c / total) for c in Counter(data).values())
+
+    @classmethod
+    def probe(cls, path: str) -> Dict:
+        """
+        Samples a few blocks spread over the file and estimates its compressibility.
+        """
+        size = os.path.getsize(path)
+        ext = os.path.splitext(path)[1].lower()
+        if ext in cls.INCOMPRESSIBLE_EXTENSIONS:
+            return {"path": path, "size": size, "compressible": False, "reason": f"extension {ext}"}
+        if size == 0:
+            return {"path": path, "size": size, "compressible": True, "reason": "empty"}
+
+        samples = []
+        step = max(size // cls.SAMPLE_BLOCKS, 1)
+        with open(path, "rb") as f:
+            for i in range(cls.SAMPLE_BLOCKS):
+                f.seek(min(i * step, max(size - cls.SAMPLE_BLOCK_SIZE, 0)))
+                block = f.read(cls.SAMPLE_BLOCK_SIZE)
+                if block:
+                    samples.append(block)
+                if size <= cls.SAMPLE_BLOCK_SIZE:
+                    break
+
+        data = b"".join(samples)
+        entropy = cls.entropy(data)
+        ratio = len(zlib.compress(data, 1)) / len(data)
+        compressible = entropy < cls.HIGH_ENTROPY and ratio < cls.POOR_RATIO
+        return {
+            "path": path,
+            "size": size,
+            "compressible": compressible,
+            "reason": f"entropy {entropy:.2f}, zlib ratio {ratio:.2f}",
+            "ratio": ratio,
+        }
+
+    @classmethod
+    def choose(cls, files: List[Tuple[str, str]], forced: str = "auto") -> Tuple[str, List[Dict]]:
+        """
+        Returns the policy name and filter chain for a list of (full_path, arcname) pairs.
+        py7zr applies one chain per archive, so per-file verdicts are weighed by size.
+        """
+        if forced in cls.FILTERS:
+            return forced, cls.FILTERS[forced]
+
+        total = 0
+        incompressible = 0
+        compressible_ratio = 0.0
+        for full_path, arcname in files:
+            verdict = cls.probe(full_path)
+            logger.info(f"Compression probe: {arcname} -> {'compressible' if verdict['compressible'] else 'incompressible'} ({verdict['reason']})")
+            total += verdict["size"]
+            if verdict["compressible"]:
+                compressible_ratio += verdict.get("ratio", 0.0) * verdict["size"]
+            else:
+                incompressible += verdict["size"]
+
+        if total == 0 or incompressible / total >= cls.STORE_SHARE:
+            policy = cls.STORE
+        elif incompressible > 0 or compressible_ratio / (total - incompressible) > cls.POOR_RATIO / 2:
+            policy = cls.FAST
+        else:
+            policy = cls.MAX
+        return policy, cls.FILTERS[policy]
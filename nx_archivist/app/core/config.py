@@ -16,18 +16,60 @@ class Settings(BaseSettings):
     RUTRACKER_USER: str | None = None
     RUTRACKER_PASS: str | None = None
     RUTRACKER_COOKIES_FILE: str = "cookies.json"
+    SEARCH_CACHE_TTL: int = 300  # seconds a search result is reused
+    SEARCH_CACHE_MAX_ENTRIES: int = 256
+    SEARCH_MAX_PAGES: int = 4  # tracker.php pages fetched per search (50 results each)
+    RUTRACKER_MAX_CONNECTIONS: int = 4  # Concurrent requests to rutracker.org
+    RUTRACKER_TIMEOUT: float = 20.0  # seconds per read/write/pool wait
+    RUTRACKER_CONNECT_TIMEOUT: float = 5.0
+    RUTRACKER_RETRIES: int = 3  # Retries on 5xx answers and timeouts
+    RUTRACKER_RATE_LIMIT: float = 2.0  # Requests per second (0 = unlimited)
+    RUTRACKER_RATE_BURST: int = 5
+    RUTRACKER_HTTP2: bool = False  # Needs the h2 package
+    RUTRACKER_PROXY: str | None = None  # e.g. http://127.0.0.1:8080; unset = HTTP(S)_PROXY from the environment
+    CATALOG_ENABLED: bool = False  # Mirror the forum listing locally and search it first (SQLite only)
+    CATALOG_CRAWL_INTERVAL: int = 1800  # seconds between incremental crawls
+    CATALOG_MAX_PAGES: int = 10  # Listing pages walked per crawl (50 topics each)
+    CATALOG_LIVE_REFRESH: bool = True  # Still search RuTracker after answering from the catalog
+    CATALOG_SEARCH_LIMIT: int = 100
     
     # Archivist Settings
     ENCRYPTION_PASSWORD: str
     IS_TELEGRAM_PREMIUM: bool = False
+    ARCHIVE_STREAMING_VOLUMES: bool = True  # Write 7z volumes directly instead of pack-then-split
+    COMPRESSION_POLICY: str = "auto"  # auto, store, fast or max
+    PACKING_WORKERS: int = 2  # Processes packing groups in parallel (0 = pack in a thread of the bot process)
+    PIPELINE_MAX_PENDING_PARTS: int = 2  # Finished volumes allowed to wait for upload before packing pauses
     
     # Storage Management
     MAX_STORAGE_GB: int = 200
     DOWNLOAD_DIR: str | None = None  # Will be auto-calculated if None
     DELETE_AFTER_UPLOAD: bool = False
+    RESUME_DIR: str | None = None  # libtorrent fast-resume store, defaults to DOWNLOAD_DIR/.resume
+    
+    # Torrent metadata cache
+    TORRENT_CACHE_DIR: str | None = None  # Defaults to DOWNLOAD_DIR/.torrent_cache
+    TORRENT_CACHE_TTL: int = 6 * 3600  # seconds
+    TORRENT_CACHE_MAX_ENTRIES: int = 256
+    TORRENT_CACHE_MAX_MB: int = 64
     
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./nx_archivist.db"
+    # SQLite connection pragmas (ignored for other databases)
+    SQLITE_JOURNAL_MODE: str = "WAL"  # WAL lets readers run alongside a writer
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # Safe with WAL, skips an fsync per commit
+    SQLITE_MMAP_SIZE_MB: int = 256
+    SQLITE_CACHE_SIZE_MB: int = 64
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_TEMP_STORE: str = "MEMORY"
+    REGISTRY_BATCH_SIZE: int = 50  # Registry writes committed together at most
+    REGISTRY_BATCH_DELAY: float = 0.5  # seconds a registry write may wait for a batch
+    DEDUP_BLOOM_CAPACITY: int = 200_000  # Keys before the in-memory dedup filter grows
+    DEDUP_BLOOM_ERROR_RATE: float = 0.01
+    DEDUP_HOT_ENTRIES: int = 10_000  # Most recently used links kept in memory; older ones are confirmed in SQLite
+    LIBRARY_PAGE_SIZE: int = 20  # Inline library results per page (Telegram allows 50)
+    LIBRARY_CACHE_TTL: int = 60  # seconds an inline library page is reused
+    LIBRARY_CACHE_MAX_ENTRIES: int = 512
     
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
@@ -0,0 +1,145 @@
+import os
+import mmap
+import struct
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ContainerReader:
+    """
+    Reads title metadata from NSP/NSZ (PFS0) and XCI/XCZ (HFS0) headers without touching the payload.
+    The file is memory-mapped and only the header pages plus the small metadata entries
+    (`*.cnmt.xml`, `*.tik`) are ever read. NCA contents are encrypted with console keys,
+    so the CNMT is only available when the dump ships its plain `.cnmt.xml`; otherwise
+    the title id comes from the ticket's rights id.
+    Results are cached per (path, size, mtime).
+    """
+    CONTENT_TYPES = {
+        "Application": "Base",
+        "Patch": "Update",
+        "AddOnContent": "DLC",
+    }
+    EXTENSIONS = {".nsp", ".nsz", ".xci", ".xcz"}
+
+    XCI_ROOT_OFFSET = 0x130  # u64 offset of the root HFS0 in the cartridge header
+    MAX_ENTRY_SIZE = 1024 * 1024  # Metadata files are a few KB
+    CACHE_SIZE = 4096
+
+    _cache = OrderedDict()  # (path, size, mtime_ns) -> metadata
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _parse_fs(mm: mmap.mmap, base: int) -> Optional[List[Tuple[str, int, int]]]:
+        """
+        Returns (name, absolute offset, size) for every entry of the PFS0/HFS0 at `base`.
+        """
+        magic = mm[base:base + 4]
+        if magic == b"PFS0":
+            entry_size = 0x18
+        elif magic == b"HFS0":
+            entry_size = 0x40
+        else:
+            return None
+
+        count, strtab_size = struct.unpack_from("<II", mm, base + 4)
+        entries_start = base + 0x10
+        strtab_start = entries_start + count * entry_size
+        data_start = strtab_start + strtab_size
+        if count > 100000 or data_start > len(mm):
+            return None
+
+        strtab = mm[strtab_start:data_start]
+        entries = []
+        for i in range(count):
+            offset, size, name_offset = struct.unpack_from("<QQI", mm, entries_start + i * entry_size)
+            end = strtab.find(b"\0", name_offset)
+            name = strtab[name_offset:end if end >= 0 else None].decode("utf-8", "replace")
+            entries.append((name, data_start + offset, size))
+        return entries
+
+    @classmethod
+    def _from_entries(cls, mm: mmap.mmap, entries: List[Tuple[str, int, int]]) -> Dict:
+        meta = {"title_id": None, "content_type": None, "version": None, "source": None}
+        for name, offset, size in entries:
+            if name.endswith(".cnmt.xml") and size <= cls.MAX_ENTRY_SIZE:
+                root = ET.fromstring(bytes(mm[offset:offset + size]))
+                meta["title_id"] = root.findtext("Id", "").lower().removeprefix("0x").upper() or None
+                meta["content_type"] = cls.CONTENT_TYPES.get(root.findtext("Type", ""))
+                version = root.findtext("Version")
+                meta["version"] = int(version) if version and version.isdigit() else None
+                meta["source"] = "cnmt"
+                return meta
+
+        for name, _, _ in entries:
+            # Ticket names are the rights id: title id followed by the key generation
+            if name.endswith(".tik") and len(name) == 36:
+                title_id = name[:16].upper()
+                meta["title_id"] = title_id
+                meta["content_type"] = cls.content_type_from_title_id(title_id)
+                meta["source"] = "ticket"
+                break
+        return meta
+
+    @staticmethod
+    def content_type_from_title_id(title_id: str) -> Optional[str]:
+        try:
+            low = int(title_id, 16) & 0xFFF
+        except ValueError:
+            return None
+        if low == 0:
+            return "Base"
+        if low == 0x800:
+            return "Update"
+        return "DLC"
+
+    @classmethod
+    def _read(cls, path: str) -> Optional[Dict]:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            entries = cls._parse_fs(mm, 0)
+            if entries is None and len(mm) >= cls.XCI_ROOT_OFFSET + 8 and mm[0x100:0x104] == b"HEAD":
+                root_offset = struct.unpack_from("<Q", mm, cls.XCI_ROOT_OFFSET)[0]
+                partitions = cls._parse_fs(mm, root_offset) or []
+                entries = []
+                for name, offset, _ in partitions:
+                    if name in ("secure", "normal", "update"):
+                        entries += cls._parse_fs(mm, offset) or []
+            if not entries:
+                return None
+            return cls._from_entries(mm, entries)
+
+    @classmethod
+    def read(cls, path: str) -> Optional[Dict]:
+        """
+        Returns {title_id, content_type, version, source} or None when the file is
+        not a readable container (wrong type, not downloaded yet, corrupt header).
+        """
+        if os.path.splitext(path)[1].lower() not in cls.EXTENSIONS:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_size == 0:
+            return None
+
+        key = (path, st.st_size, st.st_mtime_ns)
+        with cls._lock:
+            if key in cls._cache:
+                cls._cache.move_to_end(key)
+                return cls._cache[key]
+
+        try:
+            meta = cls._read(path)
+        except Exception as e:
+            logger.debug(f"Could not read container header of {path}: {e}")
+            meta = None
+
+        with cls._lock:
+            cls._cache[key] = meta
+            while len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return meta
@@ -0,0 +1,214 @@
+import sys
+import math
+import hashlib
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from app.core.config import config
+from app.db.base import async_session
+from app.db.models import FilesRegistry, TelegramStorage
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over 64-bit key digests (Kirsch-Mitzenmacher double hashing).
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.num_bits = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.num_hashes = max(int(round(self.num_bits / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, slot: int) -> List[int]:
+        h1 = slot & 0xFFFFFFFF
+        h2 = (slot >> 32) | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, slot: int):
+        bits = self.bits
+        for pos in self._positions(slot):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, slot: int) -> bool:
+        bits = self.bits
+        for pos in self._positions(slot):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+class DedupIndex:
+    """
+    In-process view of completed uploads used by check_deduplication.
+    A Bloom filter over every key answers most misses without touching SQLite.
+    Only the most recently used keys keep their first-part link in memory (`hot`);
+    a filter positive outside that set is confirmed by the database, which either
+    finds the entry (and it becomes hot) or shows a false positive.
+    Keys are (name, size) for files, folders and groups, plus (title_id, version, size) for files.
+    """
+    MISS = "miss"
+    HIT = "hit"
+    MAYBE = "maybe"
+
+    def __init__(self, capacity: Optional[int] = None, error_rate: Optional[float] = None,
+                 hot_size: Optional[int] = None):
+        self.capacity = capacity or config.DEDUP_BLOOM_CAPACITY
+        self.error_rate = error_rate or config.DEDUP_BLOOM_ERROR_RATE
+        self.hot_size = config.DEDUP_HOT_ENTRIES if hot_size is None else hot_size
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        self._slots = array("Q")  # Every key digest, to rebuild the filter when it grows
+        self._hot: "OrderedDict[int, str]" = OrderedDict()  # key digest -> link, least recently used first
+        self.loaded = False
+        self.lookups = 0
+        self.bloom_negatives = 0
+        self.hits = 0
+        self.db_checks = 0
+        self.db_hits = 0
+        self.false_positives = 0
+
+    @staticmethod
+    def _slot(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+    @staticmethod
+    def file_key(name: str, size: int) -> str:
+        return f"n|{name}|{size}"
+
+    @staticmethod
+    def title_key(title_id: str, version: int, size: int) -> str:
+        return f"t|{title_id}|{version}|{size}"
+
+    @classmethod
+    def entry_keys(cls, name: str, size: int,
+                   title_id: Optional[str] = None, version: Optional[int] = None) -> List[str]:
+        keys = [cls.file_key(name, size)]
+        if title_id and version is not None:
+            keys.append(cls.title_key(title_id, version, size))
+        return keys
+
+    def _remember(self, slot: int, link: str):
+        self._hot[slot] = link
+        self._hot.move_to_end(slot)
+        while len(self._hot) > self.hot_size:
+            self._hot.popitem(last=False)
+
+    def add(self, key: str, link: str):
+        slot = self._slot(key)
+        if slot not in self._hot:
+            if self.bloom.count >= self.bloom.capacity:
+                self._grow()
+            self.bloom.add(slot)
+            self._slots.append(slot)
+        self._remember(slot, link)
+
+    def add_entry(self, name: str, size: int, link: str,
+                  title_id: Optional[str] = None, version: Optional[int] = None):
+        for key in self.entry_keys(name, size, title_id, version):
+            self.add(key, link)
+
+    def promote(self, keys: List[str], link: str):
+        """
+        Keeps the link of an entry the database just confirmed, so the next lookup is a hit.
+        """
+        for key in keys:
+            slot = self._slot(key)
+            if slot in self.bloom:
+                self._remember(slot, link)
+
+    def _grow(self):
+        self.capacity *= 2
+        logger.info(f"Dedup index full, growing Bloom filter to {self.capacity} keys")
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        for slot in self._slots:
+            self.bloom.add(slot)
+
+    def lookup(self, key: str) -> Tuple[str, Optional[str]]:
+        """
+        Returns (MISS, None) when the key is certainly unknown, (HIT, link) when its link
+        is in memory and (MAYBE, None) when only the database can tell.
+        """
+        self.lookups += 1
+        slot = self._slot(key)
+        if slot not in self.bloom:
+            self.bloom_negatives += 1
+            return self.MISS, None
+        link = self._hot.get(slot)
+        if link is not None:
+            self._hot.move_to_end(slot)
+            self.hits += 1
+            return self.HIT, link
+        self.db_checks += 1
+        return self.MAYBE, None
+
+    def record_db_check(self, found: bool):
+        # A MAYBE the database does not confirm was a Bloom false positive
+        if found:
+            self.db_hits += 1
+        else:
+            self.false_positives += 1
+
+    async def load(self):
+        """
+        Builds the filter from every completed upload in the registry; the newest entries start hot.
+        """
+        links = {}
+        async with async_session() as session:
+            result = await session.execute(
+                select(
+                    FilesRegistry.file_original_name, FilesRegistry.file_size,
+                    FilesRegistry.title_id, FilesRegistry.version, TelegramStorage.telegram_message_link
+                )
+                .join(TelegramStorage, TelegramStorage.file_id == FilesRegistry.id)
+                .where(TelegramStorage.total_parts.isnot(None))
+                .order_by(FilesRegistry.id, TelegramStorage.part_number)
+            )
+            for name, size, title_id, version, link in result.all():
+                key = (name, size, title_id, version)
+                if key not in links:
+                    links[key] = link
+
+        needed = 2 * len(links)
+        if needed > self.capacity:
+            self.capacity = needed
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        self._slots = array("Q")
+        self._hot = OrderedDict()
+        for (name, size, title_id, version), link in links.items():
+            self.add_entry(name, size, link, title_id, version)
+        self.loaded = True
+        logger.info(
+            f"Dedup index loaded: {len(self._slots)} keys, {len(self._hot)} hot, "
+            f"{self.stats()['memory_bytes'] / 1024:.0f} KB"
+        )
+
+    def stats(self) -> Dict:
+        negatives = self.bloom_negatives + self.false_positives
+        memory = (
+            len(self.bloom.bits)
+            + self._slots.itemsize * len(self._slots)
+            + sys.getsizeof(self._hot)
+            + sum(sys.getsizeof(slot) + sys.getsizeof(link) for slot, link in self._hot.items())
+        )
+        return {
+            "keys": len(self._slots),
+            "hot": len(self._hot),
+            "bloom_bits": self.bloom.num_bits,
+            "bloom_hashes": self.bloom.num_hashes,
+            "memory_bytes": memory,
+            "lookups": self.lookups,
+            "bloom_negatives": self.bloom_negatives,
+            "hits": self.hits,
+            "db_checks": self.db_checks,
+            "db_hits": self.db_hits,
+            "false_positives": self.false_positives,
+            # Share of unknown keys the filter failed to reject
+            "false_positive_rate": self.false_positives / negatives if negatives else 0.0,
+        }
+
+dedup_index = DedupIndex()
@@ -0,0 +1,53 @@
+import io
+import hashlib
+from typing import Iterable, Tuple
+
+class HashingReader(io.BufferedIOBase):
+    """
+    Read-only wrapper that feeds every byte read through SHA-256.
+    Handing it to py7zr's `writef` hashes a file in the same pass that compresses it.
+    """
+
+    def __init__(self, raw: io.BufferedIOBase):
+        super().__init__()
+        self._raw = raw
+        self._sha256 = hashlib.sha256()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        # py7zr only seeks to measure the size before reading
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._raw.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._raw.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+        self._sha256.update(data)
+        return data
+
+    def read1(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+    def readinto(self, b) -> int:
+        n = self._raw.readinto(b)
+        if n:
+            self._sha256.update(memoryview(b)[:n])
+        return n
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+def group_hash(members: Iterable[Tuple[str, str]]) -> str:
+    """
+    Stable content hash of a group from its (name, sha256) members.
+    """
+    h = hashlib.sha256()
+    for name, digest in sorted(members):
+        h.update(f"{name}|{digest}|".encode())
+    return h.hexdigest()
@@ -0,0 +1,134 @@
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from app.core.archivist import Archivist
+from app.core.config import config
+
+logger = logging.getLogger(__name__)
+
+def _pack_in_worker(source_paths: List[str], output_dir: str, archive_name: str, events, acks) -> List[str]:
+    """
+    Runs inside a pool process. Progress and finished volumes are sent back through
+    `events`; every volume waits for an ack so the parent can apply backpressure.
+    """
+    def on_progress(p: float):
+        events.put(("progress", p))
+
+    def on_volume(index: int, path: str):
+        events.put(("volume", index, path))
+        if not acks.get():
+            raise RuntimeError(f"Packing of {archive_name} cancelled by the parent process")
+
+    def on_hash(path: str, digest: str):
+        events.put(("hash", path, digest))
+
+    try:
+        return Archivist.pack_and_split(
+            source_paths,
+            output_dir,
+            archive_name,
+            progress_callback=on_progress,
+            volume_callback=on_volume,
+            hash_callback=on_hash
+        )
+    finally:
+        events.put(("done",))
+
+class PackingExecutor:
+    """
+    Runs Archivist.pack_and_split in a process pool so py7zr/LZMA work never holds the bot's GIL.
+    `pack` is blocking and meant to be called from a worker thread; callbacks run in that thread.
+    With PACKING_WORKERS = 0 packing runs in the calling thread as before.
+    """
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = config.PACKING_WORKERS if max_workers is None else max_workers
+        self._pool = None
+        self._manager = None
+        # Parallel groups call pack from several threads at once; only one pool may be started
+        self._lock = threading.Lock()
+
+    def _ensure_pool(self):
+        with self._lock:
+            if self._pool is None:
+                logger.info(f"Starting packing pool with {self.max_workers} workers")
+                # Forking the bot (event loop, libtorrent and Telethon threads) can deadlock the child
+                context = multiprocessing.get_context("spawn")
+                self._manager = context.Manager()
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            return self._pool, self._manager
+
+    def pack(self,
+             source_paths: List[str],
+             output_dir: str,
+             archive_name: str,
+             progress_callback: Optional[callable] = None,
+             volume_callback: Optional[callable] = None,
+             hash_callback: Optional[callable] = None) -> List[str]:
+        if self.max_workers <= 0:
+            return Archivist.pack_and_split(
+                source_paths,
+                output_dir,
+                archive_name,
+                progress_callback=progress_callback,
+                volume_callback=volume_callback,
+                hash_callback=hash_callback
+            )
+
+        pool, manager = self._ensure_pool()
+        events = manager.Queue()
+        acks = manager.Queue()
+        future = pool.submit(_pack_in_worker, source_paths, output_dir, archive_name, events, acks)
+
+        error = None
+        while True:
+            try:
+                event = events.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                # A crashed worker never sends "done"
+                if future.done():
+                    break
+                continue
+
+            kind = event[0]
+            if kind == "done":
+                break
+            if kind == "progress":
+                if progress_callback:
+                    progress_callback(event[1])
+            elif kind == "hash":
+                if hash_callback:
+                    hash_callback(event[1], event[2])
+            elif kind == "volume":
+                accepted = error is None
+                if accepted and volume_callback:
+                    try:
+                        volume_callback(event[1], event[2])
+                    except Exception as e:
+                        error = e
+                        accepted = False
+                acks.put(accepted)
+
+        if error:
+            # The worker aborts on the refused ack; report why it was refused
+            try:
+                future.result()
+            except Exception:
+                pass
+            raise error
+        return future.result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+            if self._manager is not None:
+                self._manager.shutdown()
+                self._manager = None
+
+packing_executor = PackingExecutor()
@@ -0,0 +1,156 @@
+import os
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Awaitable, Callable, List, Optional, Tuple
+from app.core.config import config
+from app.core.packing import PackingExecutor, packing_executor
+
+logger = logging.getLogger(__name__)
+
+class PipelineAborted(Exception):
+    pass
+
+class PackUploadPipeline:
+    """
+    Packs a group through the packing executor and uploads every volume as soon as it is final.
+    A bounded queue sits between the two: when `max_pending` finished volumes are
+    waiting for upload, packing blocks until the uploader catches up.
+    If the run fails or is cancelled, packing stops at its next volume and the volumes
+    that were not uploaded are deleted.
+    """
+    _DONE = object()
+    PUT_POLL_INTERVAL = 0.5  # seconds between abort checks of a packing thread waiting on a full queue
+
+    _cleanups = set()  # Keeps cleanup tasks of cancelled runs alive
+
+    def __init__(self,
+                 upload: Callable[[str], Awaitable[str]],
+                 max_pending: Optional[int] = None,
+                 executor: Optional[PackingExecutor] = None):
+        self.upload = upload
+        self.max_pending = max_pending or config.PIPELINE_MAX_PENDING_PARTS
+        self.executor = executor or packing_executor
+
+    async def run(self,
+                  source_paths: List[str],
+                  output_dir: str,
+                  archive_name: str,
+                  progress_callback: Optional[callable] = None,
+                  hash_callback: Optional[callable] = None,
+                  uploaded_callback: Optional[callable] = None) -> List[Tuple[int, str, str]]:
+        """
+        Returns (part_index, part_path, link) for every uploaded volume, ordered by part index.
+        `uploaded_callback(part_index, part_path, link)` runs on the event loop right after each upload.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        aborted = threading.Event()
+
+        def put(item):
+            # Blocks the packing thread while the queue is full, but not past an abort
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    return future.result(timeout=self.PUT_POLL_INTERVAL)
+                except concurrent.futures.TimeoutError:
+                    if aborted.is_set():
+                        future.cancel()
+                        raise PipelineAborted(f"Packing of {archive_name} aborted")
+
+        def on_volume(index: int, path: str):
+            if aborted.is_set():
+                raise PipelineAborted(f"Upload failed, stopping packing of {archive_name}")
+            put((index, path))
+
+        def produce():
+            return self.executor.pack(
+                source_paths,
+                output_dir,
+                archive_name,
+                progress_callback=progress_callback,
+                volume_callback=on_volume,
+                hash_callback=hash_callback
+            )
+
+        pack_task = asyncio.create_task(asyncio.to_thread(produce))
+
+        async def next_item():
+            # Volumes still queued are delivered before the end of packing is reported
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, pack_task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                return getter.result()
+            getter.cancel()
+            return self._DONE if queue.empty() else queue.get_nowait()
+
+        uploaded = []
+        error = None
+        try:
+            while True:
+                item = await next_item()
+                if item is self._DONE:
+                    break
+                if error:
+                    # Keep draining so the packing thread never blocks on a full queue
+                    continue
+                index, path = item
+                try:
+                    link = await self.upload(path)
+                    uploaded.append((index, path, link))
+                    if uploaded_callback:
+                        uploaded_callback(index, path, link)
+                except Exception as e:
+                    logger.error(f"Upload of part {index + 1} failed: {e}")
+                    error = e
+                    aborted.set()
+        except asyncio.CancelledError:
+            aborted.set()
+            # Packing stops at its next volume; clean up once it has
+            cleanup = asyncio.create_task(self._discard_after(pack_task, output_dir, archive_name, uploaded))
+            self._cleanups.add(cleanup)
+            cleanup.add_done_callback(self._cleanups.discard)
+            raise
+
+        try:
+            await pack_task
+        except PipelineAborted:
+            if error is None:
+                raise
+        except Exception:
+            self._discard(output_dir, archive_name, uploaded)
+            raise
+        if error:
+            self._discard(output_dir, archive_name, uploaded)
+            raise error
+
+        uploaded.sort(key=lambda item: item[0])
+        return uploaded
+
+    @staticmethod
+    def _discard(output_dir: str, archive_name: str, uploaded: List[Tuple[int, str, str]]):
+        """
+        Deletes the volumes of `archive_name` that were never uploaded.
+        """
+        keep = {path for _, path, _ in uploaded}
+        try:
+            names = os.listdir(output_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(output_dir, name)
+            if name.startswith(f"{archive_name}.7z") and path not in keep:
+                try:
+                    os.remove(path)
+                    logger.info(f"Removed unfinished volume {name}")
+                except OSError as e:
+                    logger.warning(f"Could not remove unfinished volume {name}: {e}")
+
+    @classmethod
+    async def _discard_after(cls, pack_task: asyncio.Task, output_dir: str, archive_name: str, uploaded: List[Tuple[int, str, str]]):
+        try:
+            await pack_task
+        except Exception:
+            pass
+        cls._discard(output_dir, archive_name, uploaded)
@@ -1,10 +1,13 @@
 import libtorrent as lt
 import time
 import os
+import json
 import asyncio
-import hashlib
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from app.core.config import config
+from app.core.torrent_cache import torrent_cache
+from app.core.dedup_index import dedup_index
+from app.core.categorizer import Categorizer
 from app.db.base import async_session
 from app.db.models import FilesRegistry, TelegramStorage
 import logging
@@ -12,13 +15,258 @@ from sqlalchemy import select
 
 logger = logging.getLogger(__name__)
 
+# Stay well below SQLite's bound-parameter limit
+QUERY_CHUNK_SIZE = 500
+
+def _chunks(items: List, size: int = QUERY_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _index_keys(entity: Dict) -> List[str]:
+    if entity["is_folder"]:
+        return dedup_index.entry_keys(entity["name"], entity["size"])
+    # The title key also finds the same NSP repacked under another name
+    return dedup_index.entry_keys(entity["name"], entity["size"], entity["title_id"], entity["version"])
+
 class TorrentManager:
+    ALERT_INTERVAL = 2.0  # seconds between session-wide status updates
+    RESUME_SAVE_INTERVAL = 60.0  # seconds between fast-resume snapshots of active downloads
+
     def __init__(self):
-        self.ses = lt.session({'listen_interfaces': '0.0.0.0:6881'})
-        self.downloads = {}
+        self.ses = lt.session({
+            'listen_interfaces': '0.0.0.0:6881',
+            'alert_mask': lt.alert_category.status | lt.alert_category.error | lt.alert_category.storage | lt.alert_category.file_progress,
+        })
+        self.downloads = {}  # info_hash -> {"task_id", "handle", "future", "file_streams"}
+        self._pump_task = None
+        self._resume_saved = 0
+        self._restored = set()  # info_hash of restored torrents no task has claimed yet
+        self.shutting_down = False  # Tasks cancelled by shutdown keep their resume data
+
+    @property
+    def resume_dir(self) -> str:
+        path = config.RESUME_DIR or os.path.join(config.DOWNLOAD_DIR or ".", ".resume")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _resume_path(self, key: str) -> str:
+        return os.path.join(self.resume_dir, f"{key}.fastresume")
+
+    def _task_path(self, key: str) -> str:
+        return os.path.join(self.resume_dir, f"{key}.task.json")
+
+    def restore_session(self) -> List[Dict]:
+        """
+        Re-adds the torrents of interrupted download tasks from the resume store, paused.
+        With valid resume data libtorrent trusts the pieces on disk instead of rehashing them.
+        Returns the saved task metadata ({topic_id, chat_id, name}) so the tasks can be started again.
+        Resume files without a task are deleted rather than restored.
+        """
+        restored = []
+        for name in os.listdir(self.resume_dir):
+            if not name.endswith(".fastresume"):
+                continue
+            path = os.path.join(self.resume_dir, name)
+            key = name[:-len(".fastresume")]
+            try:
+                with open(self._task_path(key), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except Exception as e:
+                if not isinstance(e, FileNotFoundError):
+                    logger.error(f"Unreadable task metadata for {key}: {e}")
+                logger.info(f"Torrent {key} has no task to resume, dropping its resume data")
+                self._forget(key)
+                continue
+
+            try:
+                with open(path, "rb") as f:
+                    params = lt.read_resume_data(f.read())
+                # Nothing downloads until the task owns the torrent again
+                params.flags |= lt.torrent_flags.paused
+                params.flags &= ~lt.torrent_flags.auto_managed
+                handle = self.ses.add_torrent(params)
+            except Exception as e:
+                logger.error(f"Failed to restore torrent from {path}: {e}")
+                continue
+            self._restored.add(self._key(handle))
+            restored.append(meta)
+        if restored:
+            logger.info(f"Restored {len(restored)} torrent(s) from fast-resume data")
+        return restored
+
+    def remember_task(self, handle: lt.torrent_handle, topic_id: str, chat_id: int, name: str):
+        """
+        Stores what is needed to start the task owning `handle` again after a restart.
+        """
+        path = self._task_path(self._key(handle))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"topic_id": topic_id, "chat_id": chat_id, "name": name}, f)
+        os.replace(tmp_path, path)
+
+    def _owned(self, handle: lt.torrent_handle) -> bool:
+        # Browsed releases and finished tasks have nothing to resume
+        key = self._key(handle)
+        return key in self.downloads or os.path.exists(self._task_path(key))
+
+    def _request_resume_save(self, handle: lt.torrent_handle) -> bool:
+        if not handle.is_valid() or not handle.need_save_resume_data() or not self._owned(handle):
+            return False
+        handle.save_resume_data(lt.save_resume_flags_t.save_info_dict | lt.save_resume_flags_t.flush_disk_cache)
+        return True
+
+    def _write_resume_data(self, alert):
+        # A save requested earlier may arrive after the task finished and forgot the torrent
+        if not self._owned(alert.handle):
+            return
+        path = self._resume_path(self._key(alert.handle))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(lt.write_resume_data_buf(alert.params))
+        os.replace(tmp_path, path)
+
+    def forget_resume_data(self, handle: lt.torrent_handle):
+        self._forget(self._key(handle))
+
+    def _forget(self, key: str):
+        self._restored.discard(key)
+        for path in (self._resume_path(key), self._task_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def release(self, handle: lt.torrent_handle):
+        """
+        Called when the task owning `handle` is over: drops its resume data and, unless
+        another download still uses it, removes the torrent from the session (files stay on disk).
+        """
+        self.forget_resume_data(handle)
+        if handle.is_valid() and self._key(handle) not in self.downloads:
+            self.ses.remove_torrent(handle)
+
+    async def save_all_resume_data(self, timeout: float = 10.0):
+        """
+        Saves resume data for every torrent a download task owns; called on shutdown.
+        """
+        target = self._resume_saved + sum(self._request_resume_save(h) for h in self.ses.get_torrents())
+        deadline = time.monotonic() + timeout
+        while self._resume_saved < target and time.monotonic() < deadline:
+            await asyncio.to_thread(self.ses.wait_for_alert, 500)
+            for alert in self.ses.pop_alerts():
+                self._handle_alert(alert)
+        if self._resume_saved < target:
+            logger.warning(f"Timed out saving resume data ({target - self._resume_saved} pending)")
+
+    @staticmethod
+    def _key(handle: lt.torrent_handle) -> str:
+        return str(handle.info_hashes().get_best())
+
+    def _ensure_alert_pump(self):
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._alert_pump())
+
+    async def _alert_pump(self):
+        """
+        One loop for the whole session: asks libtorrent for the status of every torrent
+        that changed and fans it out to the tasks, then settles completion futures.
+        Exits when nothing is being watched and is restarted on the next download.
+        """
+        last_resume_save = time.monotonic()
+        while self.downloads:
+            self.ses.post_torrent_updates()
+            if time.monotonic() - last_resume_save >= self.RESUME_SAVE_INTERVAL:
+                for watch in self.downloads.values():
+                    self._request_resume_save(watch["handle"])
+                last_resume_save = time.monotonic()
+            await asyncio.sleep(self.ALERT_INTERVAL)
+            for alert in self.ses.pop_alerts():
+                try:
+                    self._handle_alert(alert)
+                except Exception as e:
+                    logger.exception(f"Error handling torrent alert {type(alert).__name__}: {e}")
+
+    def _handle_alert(self, alert):
+        if isinstance(alert, lt.state_update_alert):
+            for s in alert.status:
+                self._report_status(s)
+        elif isinstance(alert, lt.torrent_finished_alert):
+            self._finish(alert.handle)
+            # Persist the finished state so a restart does not recheck the data
+            self._request_resume_save(alert.handle)
+        elif isinstance(alert, lt.file_completed_alert):
+            watch = self.downloads.get(self._key(alert.handle))
+            if watch:
+                for queue, pending in watch["file_streams"]:
+                    if alert.index in pending:
+                        pending.discard(alert.index)
+                        queue.put_nowait(alert.index)
+        elif isinstance(alert, lt.save_resume_data_alert):
+            self._write_resume_data(alert)
+            self._resume_saved += 1
+        elif isinstance(alert, lt.save_resume_data_failed_alert):
+            self._resume_saved += 1
+        elif isinstance(alert, (lt.torrent_error_alert, lt.file_error_alert)):
+            watch = self.downloads.get(self._key(alert.handle))
+            if watch and not watch["future"].done():
+                watch["future"].set_exception(RuntimeError(alert.message()))
+
+    def _report_status(self, s: lt.torrent_status):
+        watch = self.downloads.get(str(s.info_hashes.get_best()))
+        if not watch:
+            return
+        task_id = watch["task_id"]
+        progress = s.progress * 100
+        download_rate = s.download_rate # bytes/s
+        
+        # Calculate ETA
+        eta = 0
+        if download_rate > 0:
+            remaining_bytes = s.total_wanted - s.total_wanted_done
+            eta = remaining_bytes / download_rate
+
+        if task_id:
+            from app.core.tasks import task_manager
+            task_manager.update_task(
+                task_id, 
+                progress=progress, 
+                speed=download_rate,
+                seeds=s.num_seeds,
+                total_size=s.total_wanted,
+                eta=eta
+            )
+        
+        logger.info(f'[{task_id or "TORRENT"}] {progress:.1f}% | Speed: {download_rate / 1024:.1f} KB/s | Seeds: {s.num_seeds} | Size: {s.total_wanted / (1024**3):.2f} GB | Peers: {s.num_peers}')
+
+        # Selective downloads never reach is_seeding, only "all wanted bytes done"
+        if s.total_wanted > 0 and s.total_wanted_done >= s.total_wanted and not s.paused:
+            self._finish(s.handle)
+
+    def _finish(self, handle: lt.torrent_handle):
+        watch = self.downloads.get(self._key(handle))
+        if not watch or watch["future"].done():
+            return
+        # A finished alert may predate the new priorities (everything was at 0), re-check the real state
+        s = handle.status()
+        if s.total_wanted > 0 and s.total_wanted_done >= s.total_wanted:
+            watch["future"].set_result(True)
 
     async def add_torrent(self, torrent_data: bytes, save_path: str) -> Optional[lt.torrent_handle]:
-        info = lt.torrent_info(lt.bdecode(torrent_data))
+        info = torrent_cache.get_info(torrent_data)
+        
+        # The same release is added on selection and again by the download task
+        existing = self.ses.find_torrent(info.info_hash())
+        if existing.is_valid():
+            key = self._key(existing)
+            if key in self._restored:
+                # Claimed for the first time since the restart: start from no wanted files,
+                # the pieces already on disk are kept
+                self._restored.discard(key)
+                existing.pause()
+                for i in range(info.num_files()):
+                    existing.file_priority(i, 0)
+            return existing
+            
         params = {
             'save_path': save_path,
             'ti': info,
@@ -36,6 +284,8 @@ class TorrentManager:
         """
         Checks which files/folders in the torrent already exist in the database.
         Groups files into folders if a directory contains > 4 files.
+        Files also match by (title_id, version, size), so a repack under another name is found.
+        Entries whose upload has not finished yet do not count as existing.
         """
         info = handle.get_torrent_info()
         
@@ -50,126 +300,196 @@ class TorrentManager:
             
         final_entities = []
         
-        async with async_session() as session:
-            # 2. Process each directory
-            for dirname, indices in dir_map.items():
-                # If it's a folder with > 4 files, treat as one entity
-                if dirname and len(indices) > 4:
-                    # Calculate stable hash for the folder
-                    # Sort indices by path to ensure stability
-                    sorted_indices = sorted(indices, key=lambda idx: info.file_at(idx).path)
-                    hash_input = ""
-                    total_size = 0
-                    for idx in sorted_indices:
-                        f = info.file_at(idx)
-                        # We use path and size for stable hashing
-                        hash_input += f"{f.path}|{f.size}|"
-                        total_size += f.size
-                    
-                    folder_hash = hashlib.sha256(hash_input.encode()).hexdigest()
-                    
-                    # Check DB for this folder hash
-                    stmt = select(FilesRegistry).where(
-                        FilesRegistry.file_hash == folder_hash
-                    )
-                    result = await session.execute(stmt)
-                    db_folder = result.scalar_one_or_none()
-                    
-                    status = {
-                        "is_folder": True,
-                        "name": dirname,
-                        "size": total_size,
-                        "indices": indices,
+        # 2. Build entities for each directory
+        for dirname, indices in dir_map.items():
+            # If it's a folder with > 4 files, treat as one entity
+            if dirname and len(indices) > 4:
+                # Folders are registered under their torrent path and total size
+                total_size = sum(info.file_at(idx).size for idx in indices)
+                final_entities.append({
+                    "is_folder": True,
+                    "name": dirname,
+                    "size": total_size,
+                    "indices": indices,
+                    "exists": False,
+                    "link": None
+                })
+            else:
+                # Treat files individually
+                for i in indices:
+                    f = info.file_at(i)
+                    title_id, version = Categorizer.parse_title(f.path)
+                    final_entities.append({
+                        "is_folder": False,
+                        "index": i,
+                        "name": f.path,
+                        "size": f.size,
+                        "title_id": title_id,
+                        "version": version,
                         "exists": False,
-                        "link": None,
-                        "hash": folder_hash
-                    }
-                    
-                    if db_folder:
-                        stmt_storage = select(TelegramStorage).where(TelegramStorage.file_id == db_folder.id)
-                        res_storage = await session.execute(stmt_storage)
-                        storage = res_storage.scalar_one_or_none()
-                        status["exists"] = True
-                        if storage:
-                            status["link"] = storage.telegram_message_link
-                            
-                    final_entities.append(status)
-                else:
-                    # Treat files individually
-                    for i in indices:
-                        f = info.file_at(i)
-                        # Check by name and size
-                        stmt = select(FilesRegistry).where(
-                            FilesRegistry.file_original_name == f.path,
-                            FilesRegistry.file_size == f.size
-                        )
-                        result = await session.execute(stmt)
-                        db_file = result.scalar_one_or_none()
-                        
-                        status = {
-                            "is_folder": False,
-                            "index": i,
-                            "name": f.path,
-                            "size": f.size,
-                            "exists": False,
-                            "link": None
-                        }
-                        
-                        if db_file:
-                            stmt_storage = select(TelegramStorage).where(TelegramStorage.file_id == db_file.id)
-                            res_storage = await session.execute(stmt_storage)
-                            storage = res_storage.scalar_one_or_none()
-                            status["exists"] = True
-                            if storage:
-                                status["link"] = storage.telegram_message_link
-                        
-                        final_entities.append(status)
-                        
+                        "link": None
+                    })
+
+        # 3. Answer from the in-memory index; only probable hits go to the database
+        pending = []
+        for status in final_entities:
+            if not dedup_index.loaded:
+                pending.append(status)
+                continue
+            keys = _index_keys(status)
+            verdicts = [dedup_index.lookup(key) for key in keys]
+            hit = next((link for verdict, link in verdicts if verdict == dedup_index.HIT), None)
+            if hit:
+                status["exists"] = True
+                status["link"] = hit
+            elif any(verdict == dedup_index.MAYBE for verdict, _ in verdicts):
+                pending.append(status)
+
+        if pending:
+            await self._lookup_registry(pending)
+            if dedup_index.loaded:
+                for status in pending:
+                    dedup_index.record_db_check(status["exists"])
+                    if status["exists"]:
+                        dedup_index.promote(_index_keys(status), status["link"])
+
         return final_entities
 
-    async def start_selective_download(self, handle: lt.torrent_handle, file_indices: List[int], task_id: Optional[str] = None):
+    @staticmethod
+    async def _lookup_registry(entities: List[Dict]):
         """
-        Starts downloading only the specified files.
+        Resolves entities against the registry with a constant number of bulk queries,
+        regardless of the file count.
         """
+        file_keys = {(e["name"], e["size"]) for e in entities}
+        title_keys = {
+            (e["title_id"], e["version"], e["size"]) for e in entities
+            if not e["is_folder"] and e["title_id"] and e["version"] is not None
+        }
+        
+        async with async_session() as session:
+            by_name_size = {}
+            for chunk in _chunks(sorted({name for name, _ in file_keys})):
+                result = await session.execute(
+                    select(FilesRegistry.file_original_name, FilesRegistry.file_size, FilesRegistry.id)
+                    .where(FilesRegistry.file_original_name.in_(chunk))
+                    .order_by(FilesRegistry.id)
+                )
+                for name, size, file_id in result.all():
+                    if (name, size) in file_keys:
+                        by_name_size.setdefault((name, size), []).append(file_id)
+
+            by_title = {}
+            for chunk in _chunks(sorted({title_id for title_id, _, _ in title_keys})):
+                result = await session.execute(
+                    select(FilesRegistry.title_id, FilesRegistry.version, FilesRegistry.file_size, FilesRegistry.id)
+                    .where(FilesRegistry.title_id.in_(chunk))
+                    .order_by(FilesRegistry.id)
+                )
+                for key_title, key_version, size, file_id in result.all():
+                    if (key_title, key_version, size) in title_keys:
+                        by_title.setdefault((key_title, key_version, size), []).append(file_id)
+
+            links = {}
+            candidates = set().union(*by_name_size.values(), *by_title.values())
+            for chunk in _chunks(sorted(candidates)):
+                # Parts without total_parts belong to an upload that has not finished
+                result = await session.execute(
+                    select(TelegramStorage.file_id, TelegramStorage.telegram_message_link)
+                    .where(TelegramStorage.file_id.in_(chunk), TelegramStorage.total_parts.isnot(None))
+                    .order_by(TelegramStorage.file_id, TelegramStorage.part_number)
+                )
+                for file_id, link in result.all():
+                    links.setdefault(file_id, link)  # First part of a parted archive
+
+        for status in entities:
+            ids = by_name_size.get((status["name"], status["size"]), [])
+            if not status["is_folder"]:
+                ids = ids + by_title.get((status["title_id"], status["version"], status["size"]), [])
+            file_id = next((i for i in ids if i in links), None)
+            if file_id in links:
+                status["exists"] = True
+                status["link"] = links.get(file_id)
+
+    def _begin_download(self, handle: lt.torrent_handle, file_indices: List[int], task_id: Optional[str], priorities: Optional[Dict[int, int]]) -> Dict:
         from app.core.tasks import task_manager, TaskStatus
         
         for idx in file_indices:
-            handle.file_priority(idx, 4) # Default priority
+            handle.file_priority(idx, (priorities or {}).get(idx, 4)) # 4 is the default priority
             
         handle.resume()
         
         if task_id:
             task_manager.update_task(task_id, status=TaskStatus.DOWNLOADING)
 
-        # Wait for download to complete
-        while not handle.status().is_seeding:
-            s = handle.status()
-            progress = s.progress * 100
-            download_rate = s.download_rate # bytes/s
-            
-            # Calculate ETA
-            eta = 0
-            if download_rate > 0:
-                remaining_bytes = s.total_wanted - s.total_wanted_done
-                eta = remaining_bytes / download_rate
-
-            if task_id:
-                task_manager.update_task(
-                    task_id, 
-                    progress=progress, 
-                    speed=download_rate,
-                    seeds=s.num_seeds,
-                    total_size=s.total_wanted,
-                    eta=eta
-                )
-            
-            logger.info(f'[{task_id or "TORRENT"}] {progress:.1f}% | Speed: {download_rate / 1024:.1f} KB/s | Seeds: {s.num_seeds} | Size: {s.total_wanted / (1024**3):.2f} GB | Peers: {s.num_peers}')
-            await asyncio.sleep(2) # Reduced frequency for console logs
+        key = self._key(handle)
+        watch = self.downloads.get(key)
+        if watch is None:
+            watch = {"task_id": task_id, "handle": handle, "future": asyncio.get_running_loop().create_future(), "file_streams": []}
+            self.downloads[key] = watch
+        self._ensure_alert_pump()
+        return watch
+
+    def _end_download(self, handle: lt.torrent_handle, watch: Dict):
+        from app.core.tasks import task_manager
         
-        if task_id:
-            task_manager.update_task(task_id, progress=100.0, speed=0.0, eta=0.0)
-            
-        logger.info(f'{handle.name()} complete')
+        key = self._key(handle)
+        if self.downloads.get(key) is watch and not watch["file_streams"]:
+            self.downloads.pop(key)
+        if watch["task_id"] and watch["future"].done() and not watch["future"].exception():
+            task_manager.update_task(watch["task_id"], progress=100.0, speed=0.0, eta=0.0)
+            logger.info(f'{handle.name()} complete')
+
+    async def start_selective_download(self, handle: lt.torrent_handle, file_indices: List[int], task_id: Optional[str] = None, priorities: Optional[Dict[int, int]] = None):
+        """
+        Starts downloading only the specified files and waits until they are complete.
+        """
+        watch = self._begin_download(handle, file_indices, task_id, priorities)
+        try:
+            # Wait for the alert pump to signal completion
+            await asyncio.shield(watch["future"])
+        finally:
+            self._end_download(handle, watch)
+
+    async def iter_completed_files(self, handle: lt.torrent_handle, file_indices: List[int], task_id: Optional[str] = None, priorities: Optional[Dict[int, int]] = None) -> AsyncIterator[int]:
+        """
+        Starts downloading the specified files and yields each file index as soon as
+        that file is complete (driven by file_completed_alert), finishing with the torrent.
+        """
+        watch = self._begin_download(handle, file_indices, task_id, priorities)
+        queue = asyncio.Queue()
+        pending = set(file_indices)
+        stream = (queue, pending)
+        watch["file_streams"].append(stream)
+
+        # Files already on disk (e.g. restored from resume data) never raise an alert
+        info = handle.get_torrent_info()
+        for idx, done in enumerate(handle.file_progress(flags=lt.torrent_handle.piece_granularity)):
+            if idx in pending and done >= info.file_at(idx).size:
+                pending.discard(idx)
+                queue.put_nowait(idx)
+
+        try:
+            remaining = len(set(file_indices))
+            while remaining:
+                if watch["future"].done() and queue.empty():
+                    watch["future"].result()  # Raises on torrent errors
+                    if not pending:
+                        break
+                    # Finished as a whole: whatever has not been reported yet is complete too
+                    for idx in sorted(pending):
+                        queue.put_nowait(idx)
+                    pending.clear()
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, watch["future"]}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                remaining -= 1
+                yield getter.result()
+        finally:
+            watch["file_streams"].remove(stream)
+            self._end_download(handle, watch)
 
     def get_file_path(self, handle: lt.torrent_handle, index: int) -> str:
         info = handle.get_torrent_info()
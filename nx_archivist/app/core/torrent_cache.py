@@ -0,0 +1,178 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+import libtorrent as lt
+from collections import OrderedDict
+from typing import Dict, Optional
+from app.core.config import config
+
+logger = logging.getLogger(__name__)
+
+class TorrentCache:
+    """
+    Two-level cache of `.torrent` files keyed by topic_id, with parsed metadata keyed by info-hash.
+    Memory is an LRU bounded by entry count; the disk copy (`<topic_id>.torrent`) is bounded by
+    total size. Entries older than the TTL are refetched.
+    """
+
+    def __init__(self,
+                 cache_dir: Optional[str] = None,
+                 ttl: Optional[int] = None,
+                 max_entries: Optional[int] = None,
+                 max_disk_bytes: Optional[int] = None):
+        self._cache_dir = cache_dir or config.TORRENT_CACHE_DIR
+        self.ttl = config.TORRENT_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or config.TORRENT_CACHE_MAX_ENTRIES
+        self.max_disk_bytes = max_disk_bytes or config.TORRENT_CACHE_MAX_MB * 1024 * 1024
+        self._entries = OrderedDict()  # topic_id -> (fetched_at, info_hash, data)
+        self._infos = OrderedDict()    # info_hash -> lt.torrent_info
+        self._digests = {}             # sha1 of the .torrent bytes -> info_hash
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def cache_dir(self) -> str:
+        # DOWNLOAD_DIR is only known once main() picked the storage
+        if not self._cache_dir:
+            self._cache_dir = os.path.join(config.DOWNLOAD_DIR or ".", ".torrent_cache")
+        os.makedirs(self._cache_dir, exist_ok=True)
+        return self._cache_dir
+
+    def _disk_path(self, topic_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{topic_id}.torrent")
+
+    @staticmethod
+    def info_hash(info: lt.torrent_info) -> str:
+        return str(info.info_hashes().get_best())
+
+    def _remember(self, topic_id: str, fetched_at: float, info: lt.torrent_info, data: bytes):
+        info_hash = self.info_hash(info)
+        self._entries[topic_id] = (fetched_at, info_hash, data)
+        self._entries.move_to_end(topic_id)
+        self._index_info(data, info)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _index_info(self, data: bytes, info: lt.torrent_info):
+        info_hash = self.info_hash(info)
+        self._digests[hashlib.sha1(data).digest()] = info_hash
+        self._infos[info_hash] = info
+        self._infos.move_to_end(info_hash)
+        while len(self._infos) > self.max_entries:
+            self._infos.popitem(last=False)
+        if len(self._digests) > self.max_entries * 2:
+            live = set(self._infos)
+            self._digests = {d: h for d, h in self._digests.items() if h in live}
+
+    def get(self, topic_id: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(topic_id)
+            if entry and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(topic_id)
+                self.hits += 1
+                return entry[2]
+            self._entries.pop(topic_id, None)
+
+            path = self._disk_path(topic_id)
+            try:
+                fetched_at = os.path.getmtime(path)
+                if now - fetched_at <= self.ttl:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    self._remember(topic_id, fetched_at, lt.torrent_info(lt.bdecode(data)), data)
+                    self.hits += 1
+                    return data
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Dropping unreadable cached torrent {path}: {e}")
+                try: os.remove(path)
+                except OSError: pass
+
+            self.misses += 1
+            return None
+
+    def put(self, topic_id: str, data: bytes) -> Optional[str]:
+        """
+        Caches a downloaded `.torrent` and returns its info-hash.
+        Anything that does not parse as a torrent (login pages, errors) is not cached.
+        """
+        try:
+            info = lt.torrent_info(lt.bdecode(data))
+        except Exception as e:
+            logger.warning(f"Not caching invalid torrent for topic {topic_id}: {e}")
+            return None
+
+        with self._lock:
+            self._remember(topic_id, time.time(), info, data)
+            path = self._disk_path(topic_id)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+            return self.info_hash(info)
+
+    def _evict_disk(self):
+        files = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".torrent"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        files.sort()
+        while total > self.max_disk_bytes and files:
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def get_info(self, data: bytes) -> lt.torrent_info:
+        """
+        Returns parsed metadata for `.torrent` bytes, reusing the cached torrent_info when possible.
+        """
+        digest = hashlib.sha1(data).digest()
+        with self._lock:
+            info_hash = self._digests.get(digest)
+            info = self._infos.get(info_hash) if info_hash else None
+            if info is not None:
+                self._infos.move_to_end(info_hash)
+                return info
+        info = lt.torrent_info(lt.bdecode(data))
+        with self._lock:
+            self._index_info(data, info)
+        return info
+
+    def get_info_by_hash(self, info_hash: str) -> Optional[lt.torrent_info]:
+        with self._lock:
+            return self._infos.get(info_hash)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "parsed": len(self._infos),
+            }
+
+torrent_cache = TorrentCache()
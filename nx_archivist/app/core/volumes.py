@@ -0,0 +1,222 @@
+import io
+import os
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+class VolumeWriter(io.RawIOBase):
+    """
+    Seekable write-only file object that spreads its content over rolling
+    `<base>.001`, `<base>.002`, ... volumes of at most `volume_size` bytes.
+
+    py7zr streams the archive straight into it, so every byte hits the disk once.
+    Only the current volume and the first one (py7zr rewrites the signature
+    header at offset 0 when the archive is closed) are kept open.
+
+    `on_volume_closed(index, path)` is called as soon as a volume is final:
+    volumes 2..N-1 when the writer rolls past them, the first and the last on finalize.
+    """
+
+    def __init__(self, base_path: str, volume_size: int, on_volume_closed: Optional[callable] = None):
+        super().__init__()
+        if volume_size <= 0:
+            raise ValueError("volume_size must be positive")
+        self.base_path = base_path
+        self.volume_size = volume_size
+        self.on_volume_closed = on_volume_closed
+        self.volumes: List[str] = []
+        self._handles = {}
+        self._emitted = set()
+        self._position = 0
+        self._size = 0
+        self._open_volume(0)
+
+    def volume_path(self, index: int) -> str:
+        return f"{self.base_path}.{index + 1:03d}"
+
+    def _open_volume(self, index: int):
+        handle = self._handles.get(index)
+        if handle is not None:
+            return handle
+        if index in self._emitted:
+            raise io.UnsupportedOperation(f"Volume {index + 1} was already handed off")
+        path = self.volume_path(index)
+        if index == len(self.volumes):
+            self.volumes.append(path)
+            handle = open(path, "w+b")
+        else:
+            handle = open(path, "r+b")
+        self._handles[index] = handle
+        return handle
+
+    def _close_volume(self, index: int):
+        handle = self._handles.pop(index, None)
+        if handle is not None:
+            handle.close()
+
+    def _emit(self, index: int):
+        if index in self._emitted:
+            return
+        self._emitted.add(index)
+        if self.on_volume_closed:
+            self.on_volume_closed(index, self.volumes[index])
+
+    def _roll(self, index: int):
+        # Keep the first volume open: the 7z signature header is patched in place on close
+        for open_index in list(self._handles):
+            if open_index not in (0, index):
+                self._close_volume(open_index)
+                if open_index < index:
+                    self._emit(open_index)
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return False
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            target = offset
+        elif whence == io.SEEK_CUR:
+            target = self._position + offset
+        elif whence == io.SEEK_END:
+            target = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if target < 0:
+            raise ValueError(f"Negative seek position {target}")
+        self._position = target
+        return self._position
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        view = memoryview(b).cast("B")
+        written = 0
+        while written < len(view):
+            index, offset = divmod(self._position, self.volume_size)
+            # Volumes are created strictly in order, the writer never leaves holes
+            while len(self.volumes) < index:
+                self._open_volume(len(self.volumes))
+            handle = self._open_volume(index)
+            self._roll(index)
+            handle.seek(offset)
+            chunk = view[written:written + self.volume_size - offset]
+            handle.write(chunk)
+            written += len(chunk)
+            self._position += len(chunk)
+            self._size = max(self._size, self._position)
+        return written
+
+    def flush(self):
+        for handle in self._handles.values():
+            handle.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        for index in list(self._handles):
+            self._close_volume(index)
+        super().close()
+
+    def finalize(self, single_path: Optional[str] = None) -> List[str]:
+        """
+        Closes the writer, hands off the remaining volumes and returns all volume paths in order.
+        If everything fit into a single volume and `single_path` is given,
+        that volume is renamed to it instead of keeping the `.001` suffix.
+        """
+        self.close()
+        if single_path and len(self.volumes) == 1:
+            os.replace(self.volumes[0], single_path)
+            self.volumes = [single_path]
+        for index in range(len(self.volumes)):
+            self._emit(index)
+        return list(self.volumes)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+COPY_CHUNK_SIZE = 64 * 1024 * 1024  # bytes per kernel copy call
+BUFFER_SIZE = 8 * 1024 * 1024       # reusable buffer for the portable fallback
+
+def _copy_range(src, dst, count: int, buffer: Optional[memoryview], on_bytes) -> int:
+    """
+    Copies `count` bytes from the current position of `src` to `dst`.
+    Uses kernel-side copies when available, otherwise a single reused buffer.
+    """
+    copied = 0
+    if buffer is None:
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+        while copied < count:
+            n = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK_SIZE, count - copied))
+            if n == 0:
+                break
+            copied += n
+            on_bytes(n)
+        return copied
+
+    while copied < count:
+        view = buffer[:min(len(buffer), count - copied)]
+        n = src.readinto(view)
+        if not n:
+            break
+        dst.write(view[:n])
+        copied += n
+        on_bytes(n)
+    return copied
+
+def split_file(path: str, split_size: int, progress_callback: Optional[callable] = None) -> List[str]:
+    """
+    Splits `path` into `<path>.001`, `<path>.002`, ... of at most `split_size` bytes.
+    Memory use stays bounded regardless of the part size; `progress_callback`
+    receives (bytes_done, bytes_total) as data is copied.
+    """
+    file_size = os.path.getsize(path)
+    done = 0
+
+    def on_bytes(n: int):
+        nonlocal done
+        done += n
+        if progress_callback:
+            progress_callback(done, file_size)
+
+    buffer = None
+    if not hasattr(os, "copy_file_range"):
+        buffer = memoryview(bytearray(BUFFER_SIZE))
+
+    parts = []
+    # Unbuffered handles: kernel copies move the fd offsets behind Python's back
+    with open(path, 'rb', buffering=0) as src:
+        part_num = 1
+        while done < file_size:
+            part_path = f"{path}.{part_num:03d}"
+            part_start = done
+            with open(part_path, 'wb', buffering=0) as dst:
+                try:
+                    copied = _copy_range(src, dst, split_size, buffer, on_bytes)
+                except OSError as e:
+                    if buffer is not None:
+                        raise
+                    # Cross-device or unsupported filesystem: redo this part with the buffered copy
+                    logger.info(f"copy_file_range unavailable ({e}), using buffered copy")
+                    buffer = memoryview(bytearray(BUFFER_SIZE))
+                    done = part_start
+                    src.seek(part_start)
+                    dst.seek(0)
+                    dst.truncate(0)
+                    copied = _copy_range(src, dst, split_size, buffer, on_bytes)
+            if not copied:
+                os.remove(part_path)
+                break
+            parts.append(part_path)
+            part_num += 1
+    return parts
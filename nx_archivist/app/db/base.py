@@ -1,13 +1,35 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.core.config import config
 from .models import Base
+from .migrations import run_migrations
 
 engine = create_async_engine(config.DATABASE_URL, echo=False)
 async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+def sqlite_pragmas() -> dict:
+    return {
+        "journal_mode": config.SQLITE_JOURNAL_MODE,
+        "synchronous": config.SQLITE_SYNCHRONOUS,
+        "mmap_size": config.SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+        "cache_size": -config.SQLITE_CACHE_SIZE_MB * 1024,  # Negative means KiB rather than pages
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+        "temp_store": config.SQLITE_TEMP_STORE,
+    }
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all never alters existing tables; migrations bring older databases up to date
+        return await conn.run_sync(run_migrations)
 
 async def get_session() -> AsyncSession:
     async with async_session() as session:
@@ -0,0 +1,141 @@
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Connection, inspect, select, text
+from app.core.categorizer import Categorizer
+
+logger = logging.getLogger(__name__)
+
+# Kept out of Base.metadata so create_all never touches it
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+def _add_lookup_indexes(conn: Connection):
+    # Name+size dedup lookup and the storage link lookup
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_files_registry_name_size "
+        "ON files_registry (file_original_name, file_size)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_telegram_storage_file_id "
+        "ON telegram_storage (file_id)"
+    ))
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def _add_title_version(conn: Connection):
+    _add_column(conn, "files_registry", "title_id", "VARCHAR(16)")
+    _add_column(conn, "files_registry", "version", "INTEGER")
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_files_registry_title_version "
+        "ON files_registry (title_id, version, file_size)"
+    ))
+
+    # Backfill from the names already registered
+    rows = conn.execute(text("SELECT id, file_original_name FROM files_registry WHERE title_id IS NULL")).all()
+    updates = []
+    for file_id, name in rows:
+        title_id, version = Categorizer.parse_title(name)
+        if title_id:
+            updates.append({"id": file_id, "title_id": title_id, "version": version})
+    if updates:
+        conn.execute(text("UPDATE files_registry SET title_id = :title_id, version = :version WHERE id = :id"), updates)
+    logger.info(f"Backfilled title id for {len(updates)} of {len(rows)} registry rows")
+
+def _add_tracker_catalog(conn: Connection):
+    # FTS5 is SQLite only; elsewhere the bot keeps searching RuTracker live
+    if conn.dialect.name != "sqlite":
+        logger.warning("Tracker catalog needs SQLite FTS5, skipping the full-text index")
+        return
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS tracker_topics ("
+        "topic_id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, size VARCHAR, size_bytes BIGINT, "
+        "seeds INTEGER, updated_at INTEGER, crawled_at DATETIME)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_tracker_topics_updated_at ON tracker_topics (updated_at)"
+    ))
+    # External-content index over the titles, kept in sync by triggers
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS tracker_topics_fts USING fts5("
+        "title, content='tracker_topics', content_rowid='topic_id', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS tracker_topics_ai AFTER INSERT ON tracker_topics BEGIN "
+        "INSERT INTO tracker_topics_fts (rowid, title) VALUES (new.topic_id, new.title); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS tracker_topics_ad AFTER DELETE ON tracker_topics BEGIN "
+        "INSERT INTO tracker_topics_fts (tracker_topics_fts, rowid, title) VALUES ('delete', old.topic_id, old.title); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS tracker_topics_au AFTER UPDATE OF title ON tracker_topics BEGIN "
+        "INSERT INTO tracker_topics_fts (tracker_topics_fts, rowid, title) VALUES ('delete', old.topic_id, old.title); "
+        "INSERT INTO tracker_topics_fts (rowid, title) VALUES (new.topic_id, new.title); END"
+    ))
+    conn.execute(text("INSERT INTO tracker_topics_fts (tracker_topics_fts) VALUES ('rebuild')"))
+
+def _add_library_index(conn: Connection):
+    if conn.dialect.name != "sqlite":
+        logger.warning("Library search needs SQLite FTS5, skipping the full-text index")
+        return
+    # External-content index over the registry names and title ids, kept in sync by triggers
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS files_registry_fts USING fts5("
+        "file_original_name, title_id, content='files_registry', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS files_registry_ai AFTER INSERT ON files_registry BEGIN "
+        "INSERT INTO files_registry_fts (rowid, file_original_name, title_id) "
+        "VALUES (new.id, new.file_original_name, new.title_id); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS files_registry_ad AFTER DELETE ON files_registry BEGIN "
+        "INSERT INTO files_registry_fts (files_registry_fts, rowid, file_original_name, title_id) "
+        "VALUES ('delete', old.id, old.file_original_name, old.title_id); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS files_registry_au AFTER UPDATE OF file_original_name, title_id ON files_registry BEGIN "
+        "INSERT INTO files_registry_fts (files_registry_fts, rowid, file_original_name, title_id) "
+        "VALUES ('delete', old.id, old.file_original_name, old.title_id); "
+        "INSERT INTO files_registry_fts (rowid, file_original_name, title_id) "
+        "VALUES (new.id, new.file_original_name, new.title_id); END"
+    ))
+    conn.execute(text("INSERT INTO files_registry_fts (files_registry_fts) VALUES ('rebuild')"))
+
+# Append only. Every step must also work on a database freshly made by create_all,
+# which already has the current schema.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Index files_registry (name, size) and telegram_storage.file_id", _add_lookup_indexes),
+    (2, "Add files_registry title_id/version with an index", _add_title_version),
+    (3, "Add the tracker_topics catalog with an FTS5 title index", _add_tracker_catalog),
+    (4, "Add an FTS5 index over files_registry names and title ids", _add_library_index),
+]
+
+def run_migrations(conn: Connection) -> int:
+    """
+    Applies pending migrations in version order, each in its own savepoint.
+    Returns the schema version the database ends up at.
+    """
+    _metadata.create_all(conn)
+    applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    version = max(applied, default=0)
+    for number, description, migrate in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if number in applied:
+            continue
+        logger.info(f"Applying schema migration {number}: {description}")
+        with conn.begin_nested():
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(version=number, description=description))
+        version = number
+    return version
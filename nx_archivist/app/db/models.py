@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, BigInteger, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, BigInteger, Boolean, ForeignKey, DateTime, Index
 from sqlalchemy.orm import DeclarativeBase, relationship
 from datetime import datetime
 
@@ -7,12 +7,20 @@ class Base(DeclarativeBase):
 
 class FilesRegistry(Base):
     __tablename__ = "files_registry"
+    __table_args__ = (
+        # Name+size dedup lookup
+        Index("ix_files_registry_name_size", "file_original_name", "file_size"),
+        # Cross-release dedup of the same NSP under other names
+        Index("ix_files_registry_title_version", "title_id", "version", "file_size"),
+    )
     
     id = Column(Integer, primary_key=True)
     file_original_name = Column(String, nullable=False)
     file_size = Column(BigInteger, nullable=False)
     file_hash = Column(String, unique=True, index=True)  # SHA256 or similar
     category = Column(String)  # Base, Update, DLC
+    title_id = Column(String(16), nullable=True)  # 0100XXXXXXXXXXXX from the file name
+    version = Column(Integer, nullable=True)  # v65536 -> 65536
     created_at = Column(DateTime, default=datetime.utcnow)
     
     storage_entries = relationship("TelegramStorage", back_populates="file")
@@ -21,7 +29,7 @@ class TelegramStorage(Base):
     __tablename__ = "telegram_storage"
     
     id = Column(Integer, primary_key=True)
-    file_id = Column(Integer, ForeignKey("files_registry.id"), nullable=False)
+    file_id = Column(Integer, ForeignKey("files_registry.id"), nullable=False, index=True)
     telegram_message_link = Column(String, nullable=False)
     archive_obfuscated_name = Column(String(40), nullable=False)
     is_parted = Column(Boolean, default=False)
@@ -29,3 +37,15 @@ class TelegramStorage(Base):
     total_parts = Column(Integer, nullable=True)
     
     file = relationship("FilesRegistry", back_populates="storage_entries")
+
+class TrackerTopic(Base):
+    __tablename__ = "tracker_topics"
+
+    # Local mirror of the forum listing; searched through the tracker_topics_fts index
+    topic_id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    size = Column(String)  # As listed, "3.1 GB"
+    size_bytes = Column(BigInteger)
+    seeds = Column(Integer)
+    updated_at = Column(Integer, index=True)  # Unix time of the last registration on the tracker
+    crawled_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import config
+from .base import async_session
+
+logger = logging.getLogger(__name__)
+
+Write = Callable[[AsyncSession], Awaitable[Any]]
+
+class RegistryWriter:
+    """
+    Write-behind queue for registry rows. Writes run in submission order and are
+    committed in small batches (at most `batch_size` writes or `batch_delay` seconds),
+    each batch in its own short transaction.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, batch_delay: Optional[float] = None):
+        self.batch_size = batch_size or config.REGISTRY_BATCH_SIZE
+        self.batch_delay = config.REGISTRY_BATCH_DELAY if batch_delay is None else batch_delay
+        self._queue = None
+        self._task = None
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    def submit(self, write: Write) -> asyncio.Future:
+        """
+        Queues `write(session)` and returns a future resolved with its result once committed.
+        """
+        self._ensure_task()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((write, future))
+        return future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            # A flush commits what is queued without waiting for the delay
+            while len(batch) < self.batch_size and batch[-1][0] is not self._noop:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._commit(batch)
+
+    async def _commit(self, batch: List[Tuple[Write, asyncio.Future]]):
+        try:
+            results = await self._execute(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                write, future = batch[0]
+                logger.error(f"Registry write failed: {e}")
+                if not future.done():
+                    future.set_exception(e)
+                return
+            # Retry one by one so a single bad write does not drop the rest
+            logger.warning(f"Registry batch of {len(batch)} failed ({e}), retrying writes individually")
+            for item in batch:
+                await self._commit([item])
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    async def _execute(batch: List[Tuple[Write, asyncio.Future]]) -> List[Any]:
+        async with async_session() as session:
+            results = [await write(session) for write, _ in batch]
+            await session.commit()
+        return results
+
+    async def flush(self):
+        """
+        Waits until everything submitted so far is committed.
+        """
+        if self._task is None or self._task.done():
+            return
+        await self.submit(self._noop)
+
+    @staticmethod
+    async def _noop(session: AsyncSession):
+        return None
+
+    async def close(self):
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+registry_writer = RegistryWriter()
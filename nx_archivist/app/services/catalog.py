@@ -0,0 +1,214 @@
+import re
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, text
+from sqlalchemy.dialects.sqlite import insert
+from app.core.config import config
+from app.db.base import async_session, engine
+from app.db.models import TrackerTopic
+from app.services.rutracker import RuTrackerService
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+class TrackerCatalog:
+    """
+    Local mirror of the forum 1605 listing in `tracker_topics`, searched through SQLite FTS5.
+    A background task walks the listing newest first and writes only the topics that changed.
+    After one full walk, a crawl stops at the first page with nothing new or re-registered.
+    """
+
+    def __init__(self, interval: Optional[int] = None, max_pages: Optional[int] = None):
+        self.enabled = config.CATALOG_ENABLED and engine.dialect.name == "sqlite"
+        self.interval = interval or config.CATALOG_CRAWL_INTERVAL
+        self.max_pages = max_pages or config.CATALOG_MAX_PAGES
+        self._task = None
+        self._backfilled = False
+        self.topics = 0
+        self.crawls = 0
+        self.pages = 0
+        self.written = 0
+        self.last_crawl = None
+        self.searches = 0
+        self.search_seconds = 0.0
+
+    @staticmethod
+    def match_expression(query: str) -> Optional[str]:
+        """
+        "Zelda  tears" -> '"zelda"* "tears"*': every word as a prefix, all required.
+        """
+        tokens = TOKEN_PATTERN.findall(query.casefold())
+        if not tokens:
+            return None
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    async def count(self) -> int:
+        async with async_session() as session:
+            self.topics = await session.scalar(text("SELECT count(*) FROM tracker_topics")) or 0
+        return self.topics
+
+    async def search(self, query: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Best title matches first, then the most seeded; same dicts as a live search.
+        """
+        match = self.match_expression(query)
+        if not self.enabled or not match:
+            return []
+        started = time.perf_counter()
+        try:
+            async with async_session() as session:
+                rows = (await session.execute(
+                    text(
+                        "SELECT t.topic_id, t.title, t.size, t.seeds, t.updated_at "
+                        "FROM tracker_topics_fts f JOIN tracker_topics t ON t.topic_id = f.rowid "
+                        "WHERE tracker_topics_fts MATCH :match "
+                        "ORDER BY f.rank, t.seeds DESC LIMIT :limit"
+                    ),
+                    {"match": match, "limit": limit or config.CATALOG_SEARCH_LIMIT}
+                )).all()
+        except Exception as e:
+            logger.warning(f"Catalog search for '{query}' failed: {e}")
+            return []
+        finally:
+            self.searches += 1
+            self.search_seconds += time.perf_counter() - started
+
+        return [
+            {"title": title, "id": str(topic_id), "size": size or "", "seeds": str(seeds or 0), "updated": updated or 0}
+            for topic_id, title, size, seeds, updated in rows
+        ]
+
+    async def store(self, results: List[Dict]) -> Tuple[int, int]:
+        """
+        Upserts parsed tracker.php rows, skipping the unchanged ones.
+        Returns (rows written, topics that are new or were re-registered).
+        """
+        rows = {}
+        for res in results:
+            if not res["id"].isdigit():
+                continue
+            rows[int(res["id"])] = {
+                "topic_id": int(res["id"]),
+                "title": res["title"],
+                "size": res["size"],
+                "size_bytes": RuTrackerService.size_bytes(res["size"]),
+                "seeds": int(res["seeds"]) if res["seeds"].isdigit() else 0,
+                "updated_at": res.get("updated") or 0,
+            }
+        if not rows:
+            return 0, 0
+
+        async with async_session() as session:
+            known = {
+                topic_id: (title, size, seeds, updated)
+                for topic_id, title, size, seeds, updated in (await session.execute(
+                    select(TrackerTopic.topic_id, TrackerTopic.title, TrackerTopic.size,
+                           TrackerTopic.seeds, TrackerTopic.updated_at)
+                    .where(TrackerTopic.topic_id.in_(list(rows)))
+                )).all()
+            }
+            changed = []
+            fresh = 0
+            now = datetime.utcnow()
+            for topic_id, row in rows.items():
+                current = known.get(topic_id)
+                if current is None or current[3] != row["updated_at"]:
+                    fresh += 1
+                if current != (row["title"], row["size"], row["seeds"], row["updated_at"]):
+                    changed.append({**row, "crawled_at": now})
+
+            if changed:
+                stmt = insert(TrackerTopic)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[TrackerTopic.topic_id],
+                        set_={
+                            "title": stmt.excluded.title,
+                            "size": stmt.excluded.size,
+                            "size_bytes": stmt.excluded.size_bytes,
+                            "seeds": stmt.excluded.seeds,
+                            "updated_at": stmt.excluded.updated_at,
+                            "crawled_at": stmt.excluded.crawled_at,
+                        }
+                    ),
+                    changed
+                )
+                await session.commit()
+        self.written += len(changed)
+        return len(changed), fresh
+
+    async def crawl_once(self, service: RuTrackerService) -> int:
+        """
+        Walks the forum listing through `service`. Returns rows written.
+        """
+        written = 0
+        complete = False
+        for page in range(self.max_pages):
+            try:
+                results = await service.fetch_listing(page * service.PAGE_SIZE)
+            except Exception as e:
+                logger.warning(f"Catalog crawl stopped at page {page + 1}: {e}")
+                break
+            if results is None:
+                logger.warning(f"Catalog crawl stopped at page {page + 1}: RuTracker did not answer")
+                break
+
+            page_written, fresh = await self.store(results)
+            written += page_written
+            self.pages += 1
+            if len(results) < service.PAGE_SIZE:
+                complete = True
+                break
+            # Listing is newest first: nothing new here means nothing new further down
+            if self._backfilled and not fresh:
+                break
+        else:
+            complete = True
+
+        if complete:
+            self._backfilled = True
+        self.crawls += 1
+        self.last_crawl = datetime.utcnow()
+        await self.count()
+        logger.info(f"Catalog crawl done: {written} topics written, {self.topics} in catalog")
+        return written
+
+    async def _run(self, service: RuTrackerService):
+        while True:
+            try:
+                await self.crawl_once(service)
+            except Exception as e:
+                logger.error(f"Catalog crawl failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self, service: RuTrackerService):
+        if not self.enabled or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(service))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "topics": self.topics,
+            "crawls": self.crawls,
+            "pages": self.pages,
+            "written": self.written,
+            "last_crawl": self.last_crawl,
+            "searches": self.searches,
+            "avg_search_ms": self.search_seconds / self.searches * 1000 if self.searches else 0.0,
+        }
+
+tracker_catalog = TrackerCatalog()
@@ -0,0 +1,94 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, text
+from app.core.config import config
+from app.db.base import async_session, engine
+from app.db.models import TelegramStorage
+from app.services.catalog import TrackerCatalog
+from app.services.search_cache import SearchCache
+
+logger = logging.getLogger(__name__)
+
+class LibrarySearch:
+    """
+    Finds completed uploads by original name or title id through the files_registry_fts index.
+    Pages are cached per (normalized query, offset) and dropped whenever new uploads are registered.
+    """
+
+    def __init__(self, page_size: Optional[int] = None):
+        self.enabled = engine.dialect.name == "sqlite"
+        self.page_size = min(page_size or config.LIBRARY_PAGE_SIZE, 50)
+        self.cache = SearchCache(ttl=config.LIBRARY_CACHE_TTL, max_entries=config.LIBRARY_CACHE_MAX_ENTRIES)
+
+    async def search(self, query: str, offset: int = 0) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Returns one page of {id, name, size, category, title_id, version, links}
+        and the offset of the next page (None on the last one).
+        """
+        match = TrackerCatalog.match_expression(query)
+        if not self.enabled or not match:
+            return [], None
+
+        key = f"{SearchCache.normalize(query)}#{offset}"
+        # One extra row tells whether another page exists
+        rows = self.cache.get(key)
+        if rows is None:
+            try:
+                rows = await self._query(match, offset, self.page_size + 1)
+            except Exception as e:
+                logger.warning(f"Library search for '{query}' failed: {e}")
+                return [], None
+            self.cache.put(key, rows)
+
+        next_offset = offset + self.page_size if len(rows) > self.page_size else None
+        return rows[:self.page_size], next_offset
+
+    @staticmethod
+    async def _query(match: str, offset: int, limit: int) -> List[Dict]:
+        async with async_session() as session:
+            rows = (await session.execute(
+                text(
+                    "SELECT r.id, r.file_original_name, r.file_size, r.category, r.title_id, r.version "
+                    "FROM files_registry_fts f JOIN files_registry r ON r.id = f.rowid "
+                    "WHERE files_registry_fts MATCH :match AND EXISTS ("
+                    "SELECT 1 FROM telegram_storage s WHERE s.file_id = r.id AND s.total_parts IS NOT NULL) "
+                    "ORDER BY f.rank, r.id DESC LIMIT :limit OFFSET :offset"
+                ),
+                {"match": match, "limit": limit, "offset": offset}
+            )).all()
+            if not rows:
+                return []
+
+            links: Dict[int, List[str]] = {}
+            result = await session.execute(
+                select(TelegramStorage.file_id, TelegramStorage.telegram_message_link)
+                .where(
+                    TelegramStorage.file_id.in_([row[0] for row in rows]),
+                    TelegramStorage.total_parts.isnot(None)
+                )
+                .order_by(TelegramStorage.file_id, TelegramStorage.part_number)
+            )
+            for file_id, link in result.all():
+                links.setdefault(file_id, []).append(link)
+
+        return [
+            {
+                "id": file_id,
+                "name": name,
+                "size": size,
+                "category": category,
+                "title_id": title_id,
+                "version": version,
+                "links": links.get(file_id, []),
+            }
+            for file_id, name, size, category, title_id, version in rows
+        ]
+
+    def invalidate(self):
+        # New uploads can land on any cached page
+        self.cache.clear()
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+library_search = LibrarySearch()
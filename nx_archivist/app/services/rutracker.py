@@ -1,18 +1,48 @@
+import re
 import json
 import httpx
-from typing import List, Dict
+import asyncio
+from typing import AsyncIterator, List, Dict, Optional
 from app.core.config import config
+from app.core.torrent_cache import torrent_cache
+from app.services.search_cache import SearchCache
+from app.services.transport import TrackerTransport, tracker_proxy
 import os
+import lxml.etree
+import lxml.html
+
+# Compiled once; evaluated in worker threads
+TOPIC_LINKS = lxml.etree.XPath("//a[contains(concat(' ', normalize-space(@class), ' '), ' tLink ')]")
+PARENT_ROW = lxml.etree.XPath("ancestor::tr[1]")
+ROW_CELLS = lxml.etree.XPath(".//td")
+
+SIZE_PATTERN = re.compile(r"([\d.,]+)\s*([KMGT]?B)", re.IGNORECASE)
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4}
 
 class RuTrackerService:
-    def __init__(self):
-        self.base_url = "https://rutracker.org/forum/"
+    PAGE_SIZE = 50  # tracker.php rows per page
+
+    def __init__(self, base_url: str = "https://rutracker.org/forum/"):
+        self.base_url = base_url
         self.cookies = self._load_cookies()
+        # Pooling, retries and throttling live in the transport and cover every request
+        self.transport = TrackerTransport(proxy=tracker_proxy(self.base_url))
         self.client = httpx.AsyncClient(
             base_url=self.base_url,
             cookies=self.cookies,
-            headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"}
+            headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"},
+            transport=self.transport,
+            timeout=httpx.Timeout(config.RUTRACKER_TIMEOUT, connect=config.RUTRACKER_CONNECT_TIMEOUT)
         )
+        self.search_cache = SearchCache()
+        self._inflight: Dict[str, asyncio.Task] = {}  # normalized query -> pending search
+        self._host_slots = asyncio.Semaphore(config.RUTRACKER_MAX_CONNECTIONS)
+
+    def latency_stats(self) -> Dict[str, Dict]:
+        """
+        Per-endpoint (tracker.php, dl.php) request counts, retries and latency percentiles.
+        """
+        return self.transport.latency.stats()
 
     def _load_cookies(self) -> Dict[str, str]:
         if os.path.exists(config.RUTRACKER_COOKIES_FILE):
@@ -25,33 +55,143 @@ class RuTrackerService:
 
     async def search(self, query: str) -> List[Dict]:
         """
-        Search for Nintendo Switch games on RuTracker.
+        Search for Nintendo Switch games on RuTracker (first results page).
+        Results are cached per normalized query, and identical concurrent searches share one request.
+        """
+        return await self._search_page(SearchCache.normalize(query), 0)
+
+    async def search_pages(self, query: str, max_pages: Optional[int] = None) -> AsyncIterator[List[Dict]]:
+        """
+        Yields result pages as they arrive: the first page, then up to `max_pages - 1`
+        further pages fetched concurrently. Topics already yielded are not repeated.
+        """
+        key = SearchCache.normalize(query)
+        max_pages = max_pages or config.SEARCH_MAX_PAGES
+
+        first = await self._search_page(key, 0)
+        yield first
+        if len(first) < self.PAGE_SIZE or max_pages <= 1:
+            return
+
+        seen = {r["id"] for r in first}
+        tasks = [asyncio.create_task(self._search_page(key, page * self.PAGE_SIZE)) for page in range(1, max_pages)]
+        try:
+            for next_page in asyncio.as_completed(tasks):
+                results = [r for r in await next_page if r["id"] not in seen]
+                seen.update(r["id"] for r in results)
+                if results:
+                    yield results
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _search_page(self, key: str, start: int) -> List[Dict]:
+        cache_key = key if start == 0 else f"{key}#{start}"
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+        pending = self._inflight.get(cache_key)
+        if pending is not None:
+            self.search_cache.coalesced += 1
+        else:
+            # Detached from the caller: cancelling it must not cancel the callers sharing the request
+            pending = asyncio.create_task(self._fetch_shared(key, start, cache_key))
+            pending.add_done_callback(self._retrieve_exception)
+            self._inflight[cache_key] = pending
+        return list(await asyncio.shield(pending))
+
+    async def _fetch_shared(self, key: str, start: int, cache_key: str) -> List[Dict]:
+        try:
+            results = await self._fetch_search(key, start)
+            if results is not None:
+                self.search_cache.put(cache_key, results)
+            return results or []
+        finally:
+            self._inflight.pop(cache_key, None)
+
+    @staticmethod
+    def _retrieve_exception(task: asyncio.Task):
+        # Every caller may be gone; do not warn about an unretrieved exception
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch_search(self, query: str, start: int = 0) -> Optional[List[Dict]]:
+        """
+        Runs tracker.php and parses the results; None when RuTracker did not answer with 200.
         """
-        from bs4 import BeautifulSoup
-        
         params = {
             "f": "1605", # Nintendo Switch category ID
             "nm": query
         }
-        
-        response = await self.client.get("tracker.php", params=params)
+        if start:
+            params["start"] = start
+        return await self._fetch_tracker(params)
+
+    async def fetch_listing(self, start: int = 0) -> Optional[List[Dict]]:
+        """
+        One page of the whole forum, most recently registered or updated topics first.
+        Bypasses the search cache; used by the catalog crawler.
+        """
+        params = {
+            "f": "1605",
+            "o": "1", # Registration date
+            "s": "2", # Descending
+        }
+        if start:
+            params["start"] = start
+        return await self._fetch_tracker(params)
+
+    async def _fetch_tracker(self, params: Dict) -> Optional[List[Dict]]:
+        async with self._host_slots:
+            response = await self.client.get("tracker.php", params=params)
         if response.status_code != 200:
-            return []
+            return None
             
-        soup = BeautifulSoup(response.text, "lxml")
+        # Parsing a full results page is pure CPU; keep it off the event loop
+        return await asyncio.to_thread(self.parse_search_results, response.text)
+
+    @staticmethod
+    def size_bytes(size: str) -> int:
+        """
+        "3.1 GB ↓" -> 3328599654; 0 when the size cannot be read.
+        """
+        match = SIZE_PATTERN.search(size)
+        if not match:
+            return 0
+        return int(float(match.group(1).replace(",", ".")) * SIZE_UNITS[match.group(2).upper()])
+
+    @classmethod
+    def sort_results(cls, results: List[Dict], by: str = "seeds") -> List[Dict]:
+        """
+        Orders results from any number of pages by seeds or size, largest first.
+        """
+        if by == "size":
+            key = lambda r: cls.size_bytes(r["size"])
+        else:
+            key = lambda r: int(r["seeds"]) if r["seeds"].isdigit() else 0
+        return sorted(results, key=key, reverse=True)
+
+    @staticmethod
+    def _text(element) -> str:
+        # Same as BeautifulSoup's get_text(strip=True)
+        return "".join(part.strip() for part in element.itertext() if part.strip())
+
+    @classmethod
+    def parse_search_results(cls, html: str) -> List[Dict]:
+        """
+        Extracts the topic rows of a tracker.php page with lxml XPath.
+        """
+        tree = lxml.html.fromstring(html)
         results = []
         
-        # RuTracker tracker.php table parsing logic
-        # Find all topic links
-        links = soup.find_all("a", class_="tLink")
-        
-        for link in links:
-            # Each link is inside a row
-            row = link.find_parent("tr")
-            if not row:
+        # Every result row carries one topic link
+        for link in TOPIC_LINKS(tree):
+            rows = PARENT_ROW(link)
+            if not rows:
                 continue
             
-            cells = row.find_all("td")
+            cells = ROW_CELLS(rows[0])
             if len(cells) < 10:
                 continue
             
@@ -64,17 +204,27 @@ class RuTrackerService:
                     topic_id = href.split("t=")[-1]
                 else:
                     continue
-                
+
+            # Registration/update time as a unix timestamp
+            updated = cells[9].get("data-ts_text", "")
             results.append({
-                "title": link.get_text(strip=True),
+                "title": cls._text(link),
                 "id": topic_id,
-                "size": cells[5].get_text(strip=True).replace("\xa0", " "),
-                "seeds": cells[6].get_text(strip=True)
+                "size": cls._text(cells[5]).replace("\xa0", " "),
+                "seeds": cls._text(cells[6]),
+                "updated": int(updated) if updated.isdigit() else 0
             })
             
         return results
 
     async def get_torrent_file(self, topic_id: str) -> bytes:
+        cached = torrent_cache.get(topic_id)
+        if cached is not None:
+            return cached
+            
         # forum/dl.php?t=topic_id
-        response = await self.client.get(f"dl.php?t={topic_id}")
+        async with self._host_slots:
+            response = await self.client.get(f"dl.php?t={topic_id}")
+        if response.status_code == 200:
+            torrent_cache.put(topic_id, response.content)
         return response.content
@@ -0,0 +1,54 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.core.config import config
+
+class SearchCache:
+    """
+    TTL + LRU cache of parsed search results keyed by normalized query.
+    """
+
+    def __init__(self, ttl: Optional[int] = None, max_entries: Optional[int] = None):
+        self.ttl = config.SEARCH_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or config.SEARCH_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()  # query -> (stored_at, results)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.casefold().split())
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[0] <= self.ttl:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self._entries.pop(key, None)
+        self.misses += 1
+        return None
+
+    def put(self, key: str, results: List[Dict]):
+        self._entries[key] = (time.monotonic(), results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            # Coalesced requests were served without a request of their own
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
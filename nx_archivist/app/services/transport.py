@@ -0,0 +1,178 @@
+import time
+import random
+import asyncio
+import logging
+import urllib.request
+import httpx
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from app.core.config import config
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` requests per second with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class LatencyStats:
+    """
+    Per-endpoint request count, failures and latency percentiles over a sliding window.
+    """
+    WINDOW = 256
+
+    def __init__(self):
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool, retried: bool = False):
+        self._samples.setdefault(endpoint, deque(maxlen=self.WINDOW)).append(seconds)
+        counts = self._counts.setdefault(endpoint, {"requests": 0, "errors": 0, "retries": 0})
+        counts["requests"] += 1
+        if not ok:
+            counts["errors"] += 1
+        if retried:
+            counts["retries"] += 1
+
+    def stats(self) -> Dict[str, Dict]:
+        result = {}
+        for endpoint, samples in self._samples.items():
+            ordered = sorted(samples)
+            result[endpoint] = {
+                **self._counts[endpoint],
+                "p50_ms": ordered[len(ordered) // 2] * 1000,
+                "p95_ms": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        return result
+
+def tracker_proxy(url: str) -> Optional[str]:
+    """
+    Proxy for requests to `url`: RUTRACKER_PROXY, otherwise the HTTP(S)_PROXY / ALL_PROXY /
+    NO_PROXY environment that httpx would apply to a client without a custom transport.
+    """
+    if config.RUTRACKER_PROXY:
+        return config.RUTRACKER_PROXY
+    parts = urlsplit(url)
+    if urllib.request.proxy_bypass(parts.hostname or ""):
+        return None
+    proxies = urllib.request.getproxies()
+    return proxies.get(parts.scheme) or proxies.get("all")
+
+class TrackerTransport(httpx.AsyncBaseTransport):
+    """
+    Pooled (optionally HTTP/2) transport that throttles every request through a shared
+    token bucket and retries 5xx/429 answers and timeouts with jittered exponential backoff,
+    waiting at least as long as a Retry-After header asks.
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504, 520, 521, 522, 524}
+    BACKOFF_BASE = 0.5  # seconds, doubled per attempt
+    BACKOFF_MAX = 8.0
+    RETRY_AFTER_MAX = 60.0  # longer waits are not retried, the answer goes back to the caller
+
+    def __init__(self,
+                 retries: Optional[int] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 http2: Optional[bool] = None,
+                 proxy: Optional[str] = None,
+                 inner: Optional[httpx.AsyncBaseTransport] = None):
+        self.retries = config.RUTRACKER_RETRIES if retries is None else retries
+        self.rate_limiter = rate_limiter or TokenBucket(config.RUTRACKER_RATE_LIMIT, config.RUTRACKER_RATE_BURST)
+        self.latency = LatencyStats()
+        if inner is not None:
+            self._inner = inner
+            return
+
+        limits = httpx.Limits(
+            max_connections=config.RUTRACKER_MAX_CONNECTIONS,
+            max_keepalive_connections=config.RUTRACKER_MAX_CONNECTIONS,
+            keepalive_expiry=30.0
+        )
+        http2 = config.RUTRACKER_HTTP2 if http2 is None else http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+                http2 = False
+        if proxy:
+            logger.info(f"RuTracker requests go through proxy {urlsplit(proxy).hostname}")
+        self._inner = httpx.AsyncHTTPTransport(limits=limits, http2=http2, proxy=proxy)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retries of parallel requests apart
+        return random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** attempt))
+
+    @staticmethod
+    def retry_after(response: httpx.Response) -> Optional[float]:
+        """
+        Seconds asked for by a Retry-After header (delay-seconds or HTTP-date), None without one.
+        """
+        value = response.headers.get("Retry-After", "").strip()
+        if not value:
+            return None
+        if value.isdigit():
+            return float(value)
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = request.url.path.rsplit("/", 1)[-1] or "/"
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            started = time.monotonic()
+            try:
+                response = await self._inner.handle_async_request(request)
+            except (httpx.TimeoutException, httpx.NetworkError) as e:
+                self.latency.record(endpoint, time.monotonic() - started, ok=False, retried=attempt < self.retries)
+                if attempt >= self.retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"{request.method} {endpoint} failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+            else:
+                wait = self.retry_after(response)
+                retry = (
+                    response.status_code in self.RETRY_STATUSES and attempt < self.retries
+                    and (wait is None or wait <= self.RETRY_AFTER_MAX)
+                )
+                ok = response.status_code not in self.RETRY_STATUSES and response.status_code < 500
+                self.latency.record(endpoint, time.monotonic() - started, ok=ok, retried=retry)
+                if not retry:
+                    return response
+                await response.aclose()
+                delay = max(self._backoff(attempt), wait or 0.0)
+                logger.warning(f"{request.method} {endpoint} answered {response.status_code}, retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self._inner.aclose()
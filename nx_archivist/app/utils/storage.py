@@ -2,6 +2,9 @@ import shutil
 import os
 import platform
 import logging
+import asyncio
+from typing import Dict, Optional
+from app.core.config import config
 
 logger = logging.getLogger(__name__)
 
@@ -79,14 +82,152 @@ def get_best_storage_path(base_subdir: str = "nx_archivist_data") -> str:
         
     return best_path
 
-def check_storage_limit(path: str, limit_gb: int) -> bool:
+class StorageLedger:
     """
-    Checks if the current usage of the path exceeds the limit in GB.
+    Incremental account of disk usage under DOWNLOAD_DIR.
+    The tree is walked once at startup; afterwards downloads, archive parts and cleanups
+    report their byte deltas, so usage queries are O(1). Tasks reserve their worst-case
+    footprint up front and wait in `reserve` until it fits under MAX_STORAGE_GB.
+    Files seen by the scan (e.g. those of resumed torrents) are only counted again
+    by the difference when their download completes.
     """
-    total_size = 0
-    for dirpath, dirnames, filenames in os.walk(path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            total_size += os.path.getsize(fp)
-            
-    return (total_size / (1024**3)) < limit_gb
+
+    def __init__(self, limit_bytes: Optional[int] = None):
+        self.limit_bytes = limit_bytes if limit_bytes is not None else config.MAX_STORAGE_GB * 1024**3
+        self.root = None
+        self.used = 0
+        self.reservations = {}  # task_id -> bytes reserved but not yet written
+        self.scanned = {}  # path -> bytes counted by the startup scan
+        self._changed = None
+
+    def scan(self, path: str) -> int:
+        """
+        Walks `path` once to seed the ledger with what is already on disk.
+        """
+        self.root = path
+        self.scanned = {}
+        total_size = 0
+        for dirpath, dirnames, filenames in os.walk(path):
+            for f in filenames:
+                file_path = os.path.join(dirpath, f)
+                try:
+                    size = os.path.getsize(file_path)
+                except OSError:
+                    continue
+                self.scanned[os.path.abspath(file_path)] = size
+                total_size += size
+        self.used = total_size
+        logger.info(f"Storage ledger: {self.used / (1024**3):.2f} GB used of {self.limit_bytes / (1024**3):.0f} GB")
+        return total_size
+
+    @property
+    def reserved(self) -> int:
+        return sum(self.reservations.values())
+
+    @property
+    def available(self) -> int:
+        return self.limit_bytes - self.used - self.reserved
+
+    def usage(self) -> Dict[str, int]:
+        return {"used": self.used, "reserved": self.reserved, "limit": self.limit_bytes, "available": self.available}
+
+    def _fits(self, nbytes: int) -> bool:
+        if nbytes > self.available:
+            return False
+        if self.root:
+            # The limit may be larger than the disk itself
+            try:
+                if nbytes + self.reserved > shutil.disk_usage(self.root).free:
+                    return False
+            except OSError:
+                pass
+        return True
+
+    def _disk_ceiling(self) -> Optional[int]:
+        """
+        Most the disk could ever offer: its free space plus, when uploads are cleaned up,
+        everything the running tasks will delete. None when the disk cannot be asked.
+        """
+        if not self.root:
+            return None
+        try:
+            free = shutil.disk_usage(self.root).free
+        except OSError:
+            return None
+        if config.DELETE_AFTER_UPLOAD:
+            free += self.used
+        return free
+
+    def can_reserve(self, nbytes: int) -> bool:
+        return self._fits(nbytes)
+
+    def _notify(self):
+        if self._changed is None:
+            return
+        async def wake():
+            async with self._changed:
+                self._changed.notify_all()
+        asyncio.create_task(wake())
+
+    async def reserve(self, task_id: str, nbytes: int):
+        """
+        Waits until `nbytes` fit next to current usage and other reservations, then reserves them.
+        Raises ValueError right away when they could never fit, under the limit or on the disk.
+        """
+        if nbytes > self.limit_bytes:
+            raise ValueError(f"Task needs {nbytes / (1024**3):.1f} GB, more than MAX_STORAGE_GB ({self.limit_bytes / (1024**3):.0f} GB)")
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        async with self._changed:
+            while not self._fits(nbytes):
+                ceiling = self._disk_ceiling()
+                if ceiling is not None and nbytes > ceiling:
+                    raise ValueError(f"Task needs {nbytes / (1024**3):.1f} GB, more than the disk can free ({ceiling / (1024**3):.1f} GB)")
+                logger.info(f"[{task_id}] Waiting for {nbytes / (1024**3):.2f} GB of storage ({self.available / (1024**3):.2f} GB available)")
+                await self._changed.wait()
+            self.reservations[task_id] = self.reservations.get(task_id, 0) + nbytes
+
+    def record(self, task_id: Optional[str], delta: int):
+        """
+        Records bytes written (positive) or removed (negative). Writes by a task consume its reservation.
+        """
+        self.used = max(self.used + delta, 0)
+        if delta > 0 and task_id in self.reservations:
+            self.reservations[task_id] = max(self.reservations[task_id] - delta, 0)
+        if delta < 0:
+            self._notify()
+
+    def record_file(self, task_id: Optional[str], path: str, size: int):
+        """
+        Records a downloaded file of `size` bytes; what the scan already counted for it is not added twice.
+        """
+        counted = self.scanned.pop(os.path.abspath(path), 0)
+        self.record(task_id, size - counted)
+        if counted and task_id in self.reservations:
+            # Its bytes are on disk, so the matching part of the reservation is no longer needed
+            self.reservations[task_id] = max(self.reservations[task_id] - min(counted, size), 0)
+
+    def record_removal(self, task_id: Optional[str], path: str):
+        """
+        Records the size of a file or folder that is about to be deleted.
+        """
+        size = 0
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                for f in filenames:
+                    file_path = os.path.join(dirpath, f)
+                    self.scanned.pop(os.path.abspath(file_path), None)
+                    try:
+                        size += os.path.getsize(file_path)
+                    except OSError:
+                        continue
+        elif os.path.exists(path):
+            self.scanned.pop(os.path.abspath(path), None)
+            size = os.path.getsize(path)
+        self.record(task_id, -size)
+
+    def release(self, task_id: str):
+        if self.reservations.pop(task_id, None) is not None:
+            self._notify()
+
+storage_ledger = StorageLedger()
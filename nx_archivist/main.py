@@ -16,8 +16,11 @@ bot_instance = None
 
 try:
     from app.core.config import config
-    from app.utils.storage import get_best_storage_path
+    from app.utils.storage import get_best_storage_path, storage_ledger
     from app.db.base import init_db
+    from app.db.registry_writer import registry_writer
+    from app.core.dedup_index import dedup_index
+    from app.core.packing import packing_executor
 except Exception as e:
     if "ValidationError" in str(type(e).__name__):
         logger.error("\n" + "!"*60)
@@ -33,7 +36,10 @@ except Exception as e:
 async def main():
     try:
         from aiogram import Bot, Dispatcher
-        from app.bot.handlers import search_router, auth_router
+        from app.bot.handlers import search_router, auth_router, library_router
+        from app.bot.handlers.search import torrent_manager, rutracker, process_download_task
+        from app.core.tasks import task_manager
+        from app.services.catalog import tracker_catalog
     except ImportError as e:
         if "libtorrent" in str(e) or "DLL load failed" in str(e):
             logger.error("\n" + "="*60)
@@ -52,13 +58,23 @@ async def main():
         logger.info(f"[CONFIG] Storage Channel ID: {config.STORAGE_CHANNEL_ID}")
         
         # Initialize DB
-        await init_db()
-        logger.info("Database initialized.")
+        schema_version = await init_db()
+        logger.info(f"Database initialized (schema version {schema_version}).")
+        await dedup_index.load()
         
         # Initialize storage
         if not config.DOWNLOAD_DIR:
             config.DOWNLOAD_DIR = get_best_storage_path()
         logger.info(f"Storage initialized at: {config.DOWNLOAD_DIR}")
+        storage_ledger.scan(config.DOWNLOAD_DIR)
+        
+        # Resume in-flight torrents without rechecking their data
+        restored_tasks = torrent_manager.restore_session()
+
+        # Keep the local forum catalog fresh in the background
+        if tracker_catalog.enabled:
+            logger.info(f"Tracker catalog: {await tracker_catalog.count()} topics, crawling every {tracker_catalog.interval}s")
+            tracker_catalog.start(rutracker)
 
         # Initialize Bot and Dispatcher
         bot = Bot(token=config.BOT_TOKEN.get_secret_value())
@@ -69,10 +85,25 @@ async def main():
         # Register routers
         dp.include_router(search_router)
         dp.include_router(auth_router)
+        dp.include_router(library_router)
+
+        # Tasks interrupted by the last shutdown pick their torrents up again
+        for meta in restored_tasks:
+            task_id = task_manager.create_task(meta["name"])
+            logger.info(f"Resuming task {task_id} for topic {meta['topic_id']}")
+            asyncio.create_task(process_download_task(task_id, meta["topic_id"], meta["chat_id"]))
         
         # Start polling
         logger.info("Bot started and polling...")
-        await dp.start_polling(bot)
+        try:
+            await dp.start_polling(bot)
+        finally:
+            logger.info("Saving torrent resume data...")
+            torrent_manager.shutting_down = True
+            await tracker_catalog.stop()
+            await torrent_manager.save_all_resume_data()
+            await registry_writer.close()
+            await asyncio.to_thread(packing_executor.shutdown)
     except Exception as e:
         logger.exception(f"Critical error during bot startup: {e}")
         raise
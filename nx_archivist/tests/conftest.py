@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+# Settings are read when app.core.config is imported: provide the required ones first
+_data_dir = tempfile.mkdtemp(prefix="nx_archivist_tests_")
+os.environ.update({
+    "BOT_TOKEN": "123456:test-token",
+    "API_ID": "1",
+    "API_HASH": "test",
+    "STORAGE_CHANNEL_ID": "-1001",
+    "ENCRYPTION_PASSWORD": "test-password",
+    "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(_data_dir, 'nx_archivist.db')}",
+    "DOWNLOAD_DIR": _data_dir,
+    "TELEGRAM_SESSION_NAME": os.path.join(_data_dir, "userbot"),
+    "PACKING_WORKERS": "0",
+    "RUTRACKER_RATE_LIMIT": "0",
+})
+
+# Modules import as `app.*`, the same as when running main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def local_server():
+    """
+    Starts HTTP/1.1 servers on localhost: `start(answer)` returns the base URL of one whose
+    GET requests are answered by answer(request) -> (status, headers, body).
+    """
+    servers = []
+
+    def start(answer):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keeps connections alive
+
+            def do_GET(self):
+                status, headers, body = answer(self)
+                body = body.encode() if isinstance(body, str) else body
+                try:
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except ConnectionError:
+                    pass  # The client gave up (timeouts)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,102 @@
+import os
+import hashlib
+import multivolumefile
+import py7zr
+import pytest
+from app.core.archivist import Archivist
+from app.core.config import config
+
+SPLIT_SIZE = 256 * 1024
+
+@pytest.fixture
+def sources(tmp_path):
+    src = tmp_path / "src"
+    (src / "Game [0100000000010000]").mkdir(parents=True)
+    files = {
+        "Game [0100000000010000]/Game [0100000000010000][v0].nsp": os.urandom(700 * 1024),
+        "Game [0100000000010000]/readme.txt": b"Switch dump notes\n" * 4000,
+    }
+    for name, data in files.items():
+        (src / name).write_bytes(data)
+    return src / "Game [0100000000010000]", files
+
+@pytest.fixture(autouse=True)
+def small_volumes(monkeypatch):
+    monkeypatch.setattr(Archivist, "get_split_size", staticmethod(lambda: SPLIT_SIZE))
+
+def extract(parts, dest, password):
+    base = parts[0][:-len(".001")] if parts[0].endswith(".001") else parts[0]
+    if len(parts) > 1:
+        with multivolumefile.open(base, "rb") as f, py7zr.SevenZipFile(f, password=password) as archive:
+            archive.extractall(dest)
+    else:
+        with py7zr.SevenZipFile(base, password=password) as archive:
+            archive.extractall(dest)
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_round_trip_with_password(tmp_path, sources, streaming):
+    folder, files = sources
+    out = tmp_path / "out"
+    out.mkdir()
+    volumes = []
+    hashes = {}
+
+    parts = Archivist.pack_and_split(
+        [str(folder)], str(out), "archive",
+        streaming=streaming,
+        volume_callback=lambda index, path: volumes.append((index, path)),
+        hash_callback=lambda path, digest: hashes.__setitem__(path, digest)
+    )
+
+    assert len(parts) > 1
+    # The first volume is final last: py7zr rewrites its signature header on close
+    assert sorted(volumes) == list(enumerate(parts))
+    assert all(os.path.getsize(p) <= SPLIT_SIZE for p in parts)
+    assert not (out / "archive.7z").exists()
+
+    extract(parts, tmp_path / "extracted", config.ENCRYPTION_PASSWORD)
+    for name, data in files.items():
+        assert (tmp_path / "extracted" / name).read_bytes() == data
+        # Digests come from the packing read itself
+        assert hashes[str(folder.parent / name)] == hashlib.sha256(data).hexdigest()
+
+def test_streaming_writes_every_byte_once(tmp_path, sources):
+    folder, _ = sources
+    out = tmp_path / "out"
+    out.mkdir()
+    peak = 0
+
+    def on_volume(index, path):
+        nonlocal peak
+        # No full-size archive sits next to the volumes at any point
+        assert not (out / "archive.7z").exists()
+        peak = max(peak, sum(f.stat().st_size for f in out.iterdir()))
+
+    parts = Archivist.pack_and_split([str(folder)], str(out), "archive", streaming=True, volume_callback=on_volume)
+    assert peak == sum(os.path.getsize(p) for p in parts)
+
+def test_headers_are_encrypted(tmp_path, sources):
+    folder, _ = sources
+    out = tmp_path / "out"
+    out.mkdir()
+    parts = Archivist.pack_and_split([str(folder)], str(out), "archive", streaming=True)
+
+    # Member names must not be listable without the password
+    with multivolumefile.open(str(out / "archive.7z"), "rb") as f:
+        with pytest.raises(py7zr.exceptions.PasswordRequired):
+            py7zr.SevenZipFile(f)
+
+    with pytest.raises(Exception):
+        extract(parts, tmp_path / "wrong", "not-the-password")
+
+def test_planned_files_keep_their_folder_and_skip_subfolders(tmp_path):
+    folder = tmp_path / "Release" / "DLC"
+    (folder / "Nested").mkdir(parents=True)
+    planned = folder / "dlc [0100000000011001].nsp"
+    planned.write_bytes(b"dlc" * 100)
+    # A separate group that may still be downloading
+    (folder / "Nested" / "partial.nsp").write_bytes(b"\0" * 100)
+
+    files, total_size = Archivist.collect_files([(str(planned), os.path.relpath(planned, folder.parent))])
+    assert files == [(str(planned), os.path.join("DLC", planned.name))]
+    assert total_size == 300
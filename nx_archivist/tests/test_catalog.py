@@ -0,0 +1,108 @@
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+import pytest
+from sqlalchemy import text
+import app.bot.handlers.search as search_handlers
+from app.core.config import config
+from app.db.base import init_db, async_session
+from app.services.catalog import TrackerCatalog
+from app.services.rutracker import RuTrackerService
+
+def row(topic_id, title, size, seeds, updated):
+    cells = ["", "", "<a href='tracker.php?f=1605'>Nintendo Switch</a>",
+             f"<a data-topic_id='{topic_id}' class='med tLink' href='viewtopic.php?t={topic_id}'>{title}</a>",
+             "uploader", f"<a class='dl-stub' href='dl.php?t={topic_id}'>{size}</a>", f"<b>{seeds}</b>", "0", "0",
+             "<p>date</p>"]
+    tds = "".join(f"<td>{cell}</td>" if i != 9 else f"<td data-ts_text='{updated}'>{cell}</td>" for i, cell in enumerate(cells))
+    return f"<tr>{tds}</tr>"
+
+def page(topics):
+    rows = "".join(row(*topic) for topic in topics)
+    return f"<html><body><table id='tor-tbl'><tbody>{rows}</tbody></table></body></html>"
+
+# 60 topics newest first: a full listing page and a short last one
+TOPICS = [
+    (7000000 + i, f"Catalog Game {i} [01009000000{i:03X}000][v0]" if i % 2 else f"Zelda Catalog Edition {i}", f"{i + 1}.0&nbsp;GB", 100 - i, 1700000000 - i)
+    for i in range(60)
+]
+
+def tracker_service(local_server, events, search_topics=()):
+    """
+    RuTrackerService talking to a local server that answers tracker.php with canned pages.
+    """
+    def answer(request):
+        params = parse_qs(urlsplit(request.path).query)
+        if "nm" in params:
+            events.append(("search", params["nm"][0]))
+            return 200, {}, page(search_topics)
+        start = int(params.get("start", ["0"])[0])
+        events.append(("listing", start))
+        return 200, {}, page(TOPICS[start:start + RuTrackerService.PAGE_SIZE])
+
+    return RuTrackerService(base_url=local_server(answer))
+
+@pytest.fixture(scope="module")
+def catalog(local_server):
+    asyncio.run(init_db())
+    catalog = TrackerCatalog(interval=60, max_pages=5)
+    catalog.enabled = True
+    events = []
+    asyncio.run(catalog.crawl_once(tracker_service(local_server, events)))
+    assert events == [("listing", 0), ("listing", 50)]
+    return catalog
+
+def test_crawl_fills_the_fts_catalog(catalog):
+    async def contents():
+        async with async_session() as session:
+            rows = (await session.execute(text(
+                "SELECT topic_id, title, size, size_bytes, seeds, updated_at FROM tracker_topics ORDER BY topic_id"
+            ))).all()
+            matched = (await session.execute(text(
+                "SELECT rowid FROM tracker_topics_fts WHERE tracker_topics_fts MATCH 'zelda' ORDER BY rowid"
+            ))).scalars().all()
+        return rows, matched
+
+    rows, matched = asyncio.run(contents())
+    assert catalog.topics == 60
+    assert rows[0] == (7000000, "Zelda Catalog Edition 0", "1.0 GB", 1024 ** 3, 100, 1700000000)
+    assert matched == [topic_id for topic_id, title, *_ in TOPICS if title.startswith("Zelda")]
+
+    results = asyncio.run(catalog.search("zeld edit"))
+    assert len(results) == 30
+    # Same dicts as a live search
+    assert set(results[0]) == {"title", "id", "size", "seeds", "updated"}
+    assert results[0]["id"] == "7000000" and results[0]["seeds"] == "100"
+
+def test_unchanged_listing_stops_after_one_page(catalog, local_server):
+    events = []
+    assert asyncio.run(catalog.crawl_once(tracker_service(local_server, events))) == 0
+    assert events == [("listing", 0)]
+
+class FakeMessage:
+    def __init__(self, text, events):
+        self.text = text
+        self.events = events
+
+    async def answer(self, text, **kwargs):
+        self.events.append(("answer", text.splitlines()[0]))
+
+@pytest.mark.parametrize("live_refresh", [False, True])
+def test_catalog_is_searched_before_rutracker(catalog, local_server, monkeypatch, live_refresh):
+    events = []
+    live = [(7100000, "Zelda Catalog Edition Live", "2.0&nbsp;GB", 5, 1800000000)]
+    monkeypatch.setattr(search_handlers, "tracker_catalog", catalog)
+    monkeypatch.setattr(search_handlers, "rutracker", tracker_service(local_server, events, live))
+    monkeypatch.setattr(config, "CATALOG_LIVE_REFRESH", live_refresh)
+
+    asyncio.run(search_handlers.handle_search(FakeMessage("Zelda Catalog", events)))
+
+    first_result = next(i for i, event in enumerate(events) if event[1].startswith("📦"))
+    assert events[first_result] == ("answer", "📦 Zelda Catalog Edition 0")
+    searches = [i for i, event in enumerate(events) if event[0] == "search"]
+    if live_refresh:
+        # Catalog results are out before RuTracker is asked
+        assert searches and searches[0] > first_result
+        # Live results go into the catalog too
+        assert any(res["id"] == "7100000" for res in asyncio.run(catalog.search("zelda live")))
+    else:
+        assert searches == []
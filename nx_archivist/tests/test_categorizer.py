@@ -0,0 +1,143 @@
+import os
+import re
+import struct
+import time
+from app.core.categorizer import Categorizer
+from app.core.containers import ContainerReader
+
+def write_nsp(path, entries):
+    """
+    Minimal PFS0 container holding `entries` ({name: bytes}).
+    """
+    names = b"".join(name.encode() + b"\0" for name in entries)
+    table, data, name_offset = b"", b"", 0
+    for name, payload in entries.items():
+        table += struct.pack("<QQII", len(data), len(payload), name_offset, 0)
+        name_offset += len(name) + 1
+        data += payload
+    path.write_bytes(b"PFS0" + struct.pack("<II", len(entries), len(names)) + b"\0" * 4 + table + names + data)
+
+def cnmt(content_type, title_id, version):
+    return f"<ContentMeta><Type>{content_type}</Type><Id>0x{title_id.lower()}</Id><Version>{version}</Version></ContentMeta>".encode()
+
+def test_header_wins_over_the_name(tmp_path):
+    # Renamed release: the name claims a base game, the header an update of another title
+    path = tmp_path / "Game [0100000000099000][v0].nsp"
+    write_nsp(path, {"abc.cnmt.xml": cnmt("Patch", "0100000000010800", 65536), "abc.nca": b"\0" * 64})
+
+    assert Categorizer.parse_title(str(path)) == ("0100000000099000", 0)
+    assert Categorizer.read_title(str(path)) == ("0100000000010800", 65536)
+    assert Categorizer.categorize_many([str(path)]) == ["Update"]
+
+def test_name_is_used_without_a_readable_header(tmp_path):
+    missing = tmp_path / "Game [0100000000099000][v131072].nsp"
+    assert Categorizer.read_title(str(missing)) == ("0100000000099000", 131072)
+
+    # A ticket carries the title id but no version
+    ticketed = tmp_path / "Game [0100000000099000][v3].nsp"
+    write_nsp(ticketed, {"0100000000012000000000000000000a.tik": b"\0" * 16})
+    assert Categorizer.read_title(str(ticketed)) == ("0100000000012000", 3)
+
+def test_header_reads_take_milliseconds(tmp_path):
+    # Sparse 4 GB releases: reading the payload would take seconds, the header a few pages
+    paths = []
+    for i in range(20):
+        path = tmp_path / f"Release {i}.nsp"
+        write_nsp(path, {"abc.cnmt.xml": cnmt("Application", f"0100000000{i:02X}0000", 0), "abc.nca": b"\0" * 64})
+        os.truncate(path, 4 * 1024 ** 3)
+        paths.append(str(path))
+
+    ContainerReader._cache.clear()
+    started = time.perf_counter()
+    metas = [ContainerReader.read(path) for path in paths]
+    per_file_ms = (time.perf_counter() - started) / len(paths) * 1000
+    print(f"ContainerReader: {per_file_ms:.3f} ms per header")
+
+    assert [meta["content_type"] for meta in metas] == ["Base"] * len(paths)
+    assert per_file_ms < 20
+
+NAMES = [
+    "Zelda [0100000000010000][v0].nsp",
+    "Zelda Update [0100000000010800][v65536].nsp",
+    "Zelda [0100000000010800][v131072].nsp",
+    "Zelda DLC Pack 1.nsp",
+    "Zelda [0100000000011001][v0].nsp",
+    "readme.txt",
+]
+
+def test_categorize_many_matches_categorize(tmp_path):
+    paths = [str(tmp_path / name) for name in NAMES]
+    assert Categorizer.categorize_many(paths) == [Categorizer.categorize(p) for p in paths]
+    assert Categorizer.categorize_many(paths) == ["Base", "Update", "Update", "DLC", "DLC", "Unknown"]
+
+def test_repeated_names_are_scanned_once(tmp_path, monkeypatch):
+    Categorizer._scan.cache_clear()
+    scandirs = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scandirs.append(path) or real_scandir(path))
+
+    paths = [str(tmp_path / name) for name in NAMES] * 50
+    Categorizer.categorize_many(paths)
+
+    info = Categorizer.memo_info()
+    assert info.misses == len(NAMES)
+    assert info.hits == len(paths) - len(NAMES)
+    # One directory listing for the whole batch
+    assert scandirs == [str(tmp_path)]
+
+BASELINE_UPDATE = re.compile(r"\[0100[0-9A-F]{8}[0-9A-F]{3}[1-9A-F]000\]", re.IGNORECASE)
+BASELINE_DLC = re.compile(r"\[0100[0-9A-F]{8}[0-9A-F]{3}[0-9A-F][1-9A-F]00\]", re.IGNORECASE)
+BASELINE_BASE = re.compile(r"\[0100[0-9A-F]{8}000\]", re.IGNORECASE)
+
+def baseline_categorize(filename):
+    # Categorizer.categorize before the single-pass scan and the memo
+    filename_lower = filename.lower()
+    if "update" in filename_lower or "v65536" in filename_lower or "v131072" in filename_lower:
+        return "Update"
+    if "dlc" in filename_lower:
+        return "DLC"
+    if BASELINE_UPDATE.search(filename):
+        return "Update"
+    if BASELINE_DLC.search(filename):
+        return "DLC"
+    if BASELINE_BASE.search(filename):
+        return "Base"
+    return "Unknown"
+
+def release_names(count):
+    """
+    `count` release file names: bases, updates and DLCs of a few thousand titles, each name repeated
+    a few times as in re-uploaded releases.
+    """
+    kinds = [
+        "{title} [{base:013X}000][v0].nsp",
+        "{title} [{base:013X}800][v{version}].nsp",
+        "{title} Update {version} [{base:013X}800][v{version}].nsp",
+        "{title} DLC {n} [{base:013X}{n:03X}][v0].nsp",
+        "{title} [{base:013X}{n:03X}][v0].nsz",
+        "{title} (Deluxe Edition) [{base:013X}000][v0][US].xci",
+    ]
+    names = []
+    for i in range(count // 4):
+        kind = kinds[i % len(kinds)]
+        names.append(kind.format(title=f"Switch Game {i // len(kinds)}", base=0x0100000000100 + i // len(kinds),
+                                  version=65536 * (i % 7), n=1 + i % 200))
+    return [name for _ in range(4) for name in names]
+
+def test_categorize_many_microbenchmark(tmp_path):
+    paths = [str(tmp_path / name) for name in release_names(100_000)]
+
+    def timed(categorize):
+        started = time.perf_counter()
+        categorize()
+        return time.perf_counter() - started
+
+    baseline = timed(lambda: [baseline_categorize(path) for path in paths])
+    Categorizer._scan.cache_clear()
+    cold = timed(lambda: Categorizer.categorize_many(paths))
+    warm = timed(lambda: Categorizer.categorize_many(paths))
+    print(f"Categorizer over {len(paths)} names: baseline {baseline * 1000:.0f} ms, "
+          f"categorize_many {cold * 1000:.0f} ms cold, {warm * 1000:.0f} ms memoized")
+
+    assert Categorizer.memo_info().misses == len(set(paths))
+    assert warm < baseline
@@ -0,0 +1,50 @@
+import os
+import time
+import py7zr
+from app.core.archivist import Archivist
+from app.core.compression import CompressionPolicy
+
+def write(path, data):
+    path.write_bytes(data)
+    return (str(path), path.name)
+
+def test_switch_containers_are_stored(tmp_path):
+    files = [write(tmp_path / "Game [0100000000010000][v0].nsp", b"\0" * 100000)]
+    policy, filters = CompressionPolicy.choose(files)
+    assert policy == CompressionPolicy.STORE
+    assert filters[0]["id"] == py7zr.FILTER_COPY
+    assert filters[-1]["id"] == py7zr.FILTER_CRYPTO_AES256_SHA256
+
+def test_random_payload_is_stored_whatever_the_extension(tmp_path):
+    files = [write(tmp_path / "payload.bin", os.urandom(512 * 1024))]
+    assert CompressionPolicy.choose(files)[0] == CompressionPolicy.STORE
+
+def test_text_gets_full_lzma(tmp_path):
+    files = [write(tmp_path / "notes.txt", b"Title 0100000000010000 version 65536\n" * 20000)]
+    assert CompressionPolicy.choose(files)[0] == CompressionPolicy.MAX
+
+def test_mixed_group_gets_fast_preset(tmp_path):
+    files = [
+        write(tmp_path / "notes.txt", b"changelog line\n" * 40000),
+        write(tmp_path / "Game.nsp", os.urandom(200 * 1024)),
+    ]
+    assert CompressionPolicy.choose(files)[0] == CompressionPolicy.FAST
+
+def test_forced_policy_skips_the_probe(tmp_path):
+    assert CompressionPolicy.choose([], forced="max")[0] == CompressionPolicy.MAX
+
+def test_store_is_faster_than_lzma_on_incompressible_input(tmp_path, monkeypatch):
+    src = tmp_path / "Game [0100000000010000][v0].nsp"
+    src.write_bytes(os.urandom(4 * 1024 * 1024))
+    timings = {}
+    for policy in (CompressionPolicy.STORE, CompressionPolicy.MAX):
+        monkeypatch.setattr("app.core.archivist.config.COMPRESSION_POLICY", policy)
+        out = tmp_path / policy
+        out.mkdir()
+        started = time.perf_counter()
+        parts = Archivist.pack_and_split([str(src)], str(out), "archive", streaming=True)
+        timings[policy] = (time.perf_counter() - started, sum(os.path.getsize(p) for p in parts))
+
+    # Storing costs no size on encrypted payloads and is several times faster
+    assert timings[CompressionPolicy.STORE][1] <= timings[CompressionPolicy.MAX][1] * 1.01
+    assert timings[CompressionPolicy.STORE][0] * 3 < timings[CompressionPolicy.MAX][0]
@@ -0,0 +1,176 @@
+import os
+import asyncio
+import hashlib
+import libtorrent as lt
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event, select
+from app.core.config import config
+from app.core.dedup_index import dedup_index
+from app.db.base import init_db, async_session, engine
+from app.db.models import FilesRegistry
+from app.bot.handlers.search import torrent_manager, register_part, finalize_group
+
+class FakeHandle:
+    def __init__(self, info):
+        self._info = info
+
+    def get_torrent_info(self):
+        return self._info
+
+def make_handle(name, files):
+    """
+    Handle stand-in for a multi-file torrent `name` with (path inside the torrent, size) files.
+    """
+    piece_length = 16 * 1024
+    total = sum(size for _, size in files)
+    info = {
+        b"name": name.encode(),
+        b"piece length": piece_length,
+        b"pieces": b"\0" * 20 * (total // piece_length + 1),
+        b"files": [{b"length": size, b"path": [part.encode() for part in path.split("/")]} for path, size in files],
+    }
+    return FakeHandle(lt.torrent_info(lt.bdecode(lt.bencode({b"info": info}))))
+
+async def register(group, files, links):
+    """
+    Registers an uploaded group the way process_group does.
+    """
+    total_size = sum(size for _, size in files)
+    file_hashes = {
+        os.path.join(config.DOWNLOAD_DIR, *path.split("/")): (hashlib.sha256(path.encode()).hexdigest(), size)
+        for path, size in files
+    }
+    uploaded = [(i, f"part{i}", link) for i, link in enumerate(links)]
+    record = {"size": total_size, "file_id": None}
+    async with async_session() as session:
+        for i, _, link in uploaded:
+            await register_part(session, record, group, "archive", i, link)
+        registered = await finalize_group(session, record, group, total_size, "archive", uploaded, file_hashes)
+        await session.commit()
+    return registered
+
+@pytest.fixture(scope="module", autouse=True)
+def database():
+    asyncio.run(init_db())
+
+def lookup(handle, use_index):
+    async def main():
+        if use_index:
+            await dedup_index.load()
+        else:
+            dedup_index.loaded = False
+        return await torrent_manager.check_deduplication(handle)
+    return asyncio.run(main())
+
+@pytest.mark.parametrize("use_index", [False, True])
+def test_folder_group_is_found_again(use_index):
+    release = f"Zelda {use_index}"
+    folder = [(f"DLC/dlc{i} [0100000000011{i:03X}].nsp", 1000 + i) for i in range(6)]
+    handle = make_handle(release, folder + [("Zelda [0100000000010000][v0].nsp", 5)])
+    group = {"name": f"{release}/DLC", "category": "DLC", "entities": []}
+    asyncio.run(register(group, [(f"{release}/{path}", size) for path, size in folder], ["https://t.me/c/1/10", "https://t.me/c/1/11"]))
+
+    entities = lookup(handle, use_index)
+    folders = [e for e in entities if e["is_folder"]]
+    assert [e["name"] for e in folders] == [f"{release}/DLC"]
+    assert folders[0]["exists"] and folders[0]["link"] == "https://t.me/c/1/10"
+    assert not next(e for e in entities if not e["is_folder"])["exists"]
+
+def test_group_members_are_registered_with_torrent_paths():
+    files = [(f"Pack/Sub/file{i}.nsp", 10 + i) for i in range(2)]
+    group = {"name": "Pack", "category": "Base", "entities": []}
+    registered = asyncio.run(register(group, files, ["https://t.me/c/1/20"]))
+    assert [name for name, *_ in registered] == ["Pack", "Pack/Sub/file0.nsp", "Pack/Sub/file1.nsp"]
+
+@contextmanager
+def count_queries():
+    queries = []
+    def on_execute(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            queries.append(statement)
+    event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", on_execute)
+
+def loose_files(count, base_size=100):
+    # At most four files per directory, so every file is an entity of its own
+    return [(f"d{i // 4}/file{i} [01000000000{i:05X}][v0].nsp", base_size + i) for i in range(count)]
+
+def test_lookup_query_count_does_not_grow_with_the_file_count():
+    release = "Bulk"
+    known = loose_files(3)
+    for path, size in known:
+        asyncio.run(register({"name": f"{release}/{path}", "category": "Base", "entities": []}, [(f"{release}/{path}", size)], [f"https://t.me/c/1/{size}"]))
+
+    counts = []
+    for count in (10, 200):
+        handle = make_handle(release, loose_files(count))
+        with count_queries() as queries:
+            entities = lookup(handle, use_index=False)
+        counts.append(len(queries))
+        assert [e["exists"] for e in entities] == [i < 3 for i in range(count)]
+        assert entities[0]["link"] == "https://t.me/c/1/100"
+    # Names, titles and links: one query each
+    assert counts == [3, 3]
+
+def test_indexed_entries_are_answered_without_the_database():
+    release = "Indexed"
+    files = loose_files(8, base_size=1000)
+    for path, size in files[:4]:
+        asyncio.run(register({"name": f"{release}/{path}", "category": "Base", "entities": []}, [(f"{release}/{path}", size)], [f"https://t.me/c/2/{size}"]))
+    handle = make_handle(release, files)
+
+    asyncio.run(dedup_index.load())
+    hits = dedup_index.hits
+    with count_queries() as queries:
+        entities = asyncio.run(torrent_manager.check_deduplication(handle))
+    assert [e["exists"] for e in entities] == [True] * 4 + [False] * 4
+    # Name and title key of every known file
+    assert dedup_index.hits - hits == 8
+    # Misses are rejected by the Bloom filter; a false positive costs at most one bulk lookup
+    assert len(queries) <= 3
+
+def test_registry_rows_take_title_and_version_from_the_header():
+    name = "Renamed/Game [0100000000099000][v0].nsp"
+    # What process_group read from the downloaded file's header
+    group = {"name": name, "category": "Update", "entities": [], "titles": {name: ("0100000000010800", 65536)}}
+    registered = asyncio.run(register(group, [(name, 4321)], ["https://t.me/c/3/1"]))
+    assert registered[0][3:] == ("0100000000010800", 65536)
+
+    async def rows():
+        async with async_session() as session:
+            return (await session.execute(
+                select(FilesRegistry.title_id, FilesRegistry.version).where(FilesRegistry.file_original_name == name)
+            )).all()
+    assert asyncio.run(rows()) == [("0100000000010800", 65536)]
+
+def test_entries_outside_the_hot_set_are_confirmed_by_the_database(monkeypatch):
+    release = "Cold"
+    files = loose_files(6, base_size=5000)
+    for path, size in files[:4]:
+        asyncio.run(register({"name": f"{release}/{path}", "category": "Base", "entities": []}, [(f"{release}/{path}", size)], [f"https://t.me/c/4/{size}"]))
+    handle = make_handle(release, files)
+
+    # Room for the newest file's two keys only
+    monkeypatch.setattr(dedup_index, "hot_size", 2)
+    asyncio.run(dedup_index.load())
+    assert dedup_index.stats()["hot"] == 2
+    assert dedup_index.stats()["keys"] > 2
+    db_hits = dedup_index.db_hits
+
+    entities = asyncio.run(torrent_manager.check_deduplication(handle))
+    assert [e["exists"] for e in entities] == [True] * 4 + [False] * 2
+    assert [e["link"] for e in entities[:4]] == [f"https://t.me/c/4/{size}" for _, size in files[:4]]
+    # The three older files were answered by the database, not counted as false positives
+    assert dedup_index.db_hits - db_hits == 3
+    assert len(dedup_index._hot) == 2
+
+    # The last confirmed entry is hot afterwards
+    hits = dedup_index.hits
+    with count_queries() as queries:
+        entities = asyncio.run(torrent_manager.check_deduplication(make_handle(release, files[2:3])))
+    assert entities[0]["exists"] and queries == []
+    assert dedup_index.hits > hits
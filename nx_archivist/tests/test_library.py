@@ -0,0 +1,48 @@
+import asyncio
+import logging
+import app.bot.handlers.library as library_handlers
+from app.bot.handlers.library import format_entry, handle_library_query
+
+ENTRY = {
+    "id": 1,
+    "name": "Game_Name [0100000000010000][v0] *NSP* <RUS>.nsp",
+    "category": "Base",
+    "size": 5 * 1024 ** 3,
+    "title_id": "0100000000010000",
+    "version": 0,
+    "links": ["https://t.me/c/1/2", "https://t.me/c/1/3"],
+}
+
+class FakeInlineQuery:
+    def __init__(self, query, error=None):
+        self.query = query
+        self.offset = ""
+        self.error = error
+        self.answers = []
+
+    async def answer(self, results, **kwargs):
+        if self.error:
+            raise self.error
+        self.answers.append(results)
+
+def test_names_are_escaped_for_html():
+    text = format_entry(ENTRY)
+    assert text.splitlines() == [
+        "📦 <b>Game_Name [0100000000010000][v0] *NSP* &lt;RUS&gt;.nsp</b> (5.00 GB)",
+        '🔹 <a href="https://t.me/c/1/2">Посилання - Part 1</a>',
+        '🔹 <a href="https://t.me/c/1/3">Посилання - Part 2</a>',
+    ]
+
+def test_failed_answer_is_logged(monkeypatch, caplog):
+    async def search(query, offset):
+        return [ENTRY], None
+    monkeypatch.setattr(library_handlers.library_search, "search", search)
+
+    query = FakeInlineQuery("game")
+    asyncio.run(handle_library_query(query))
+    content = query.answers[0][0].input_message_content
+    assert content.parse_mode == "HTML" and content.message_text == format_entry(ENTRY)
+
+    with caplog.at_level(logging.WARNING, logger=library_handlers.__name__):
+        asyncio.run(handle_library_query(FakeInlineQuery("game", error=RuntimeError("query is too old"))))
+    assert "query is too old" in caplog.text
@@ -0,0 +1,65 @@
+import os
+import time
+import hashlib
+import threading
+import app.core.packing as packing
+from app.core.packing import PackingExecutor
+
+def test_pool_packs_in_a_spawned_worker(tmp_path):
+    src = tmp_path / "Game [0100000000010000][v0].nsp"
+    data = os.urandom(256 * 1024)
+    src.write_bytes(data)
+    out = tmp_path / "out"
+    out.mkdir()
+
+    executor = PackingExecutor(max_workers=1)
+    volumes = []
+    hashes = {}
+    try:
+        parts = executor.pack(
+            [str(src)], str(out), "archive",
+            volume_callback=lambda index, path: volumes.append(index),
+            hash_callback=lambda path, digest: hashes.__setitem__(path, digest)
+        )
+        assert executor._pool._mp_context.get_start_method() == "spawn"
+    finally:
+        executor.shutdown()
+
+    assert volumes == [0]
+    assert [os.path.basename(p) for p in parts] == ["archive.7z"]
+    assert hashes == {str(src): hashlib.sha256(data).hexdigest()}
+    assert executor._pool is None and executor._manager is None
+
+def test_parallel_packs_share_one_pool(tmp_path, monkeypatch):
+    pools = []
+
+    class SlowStartPool(packing.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            # Widen the window in which a second caller could start its own pool
+            time.sleep(0.2)
+            super().__init__(*args, **kwargs)
+            pools.append(self)
+
+    monkeypatch.setattr(packing, "ProcessPoolExecutor", SlowStartPool)
+    executor = PackingExecutor(max_workers=2)
+    results = {}
+
+    def pack(name):
+        src = tmp_path / f"{name}.nsp"
+        src.write_bytes(os.urandom(64 * 1024))
+        out = tmp_path / name
+        out.mkdir()
+        results[name] = executor.pack([str(src)], str(out), name)
+
+    threads = [threading.Thread(target=pack, args=(name,)) for name in ("first", "second")]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=120)
+        assert len(pools) == 1
+    finally:
+        executor.shutdown()
+
+    assert sorted(results) == ["first", "second"]
+    assert all(len(parts) == 1 and os.path.exists(parts[0]) for parts in results.values())
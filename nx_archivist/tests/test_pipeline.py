@@ -0,0 +1,88 @@
+import os
+import time
+import asyncio
+import threading
+import pytest
+from app.core.pipeline import PackUploadPipeline
+
+class FakeExecutor:
+    """
+    Stands in for PackingExecutor: writes `volumes` small files and hands each one over.
+    """
+
+    def __init__(self, volumes: int, delay: float = 0.0):
+        self.volumes = volumes
+        self.delay = delay
+        self.finished = threading.Event()
+
+    def pack(self, source_paths, output_dir, archive_name, progress_callback=None, volume_callback=None, hash_callback=None):
+        try:
+            parts = []
+            for index in range(self.volumes):
+                time.sleep(self.delay)
+                path = os.path.join(output_dir, f"{archive_name}.7z.{index + 1:03d}")
+                with open(path, "wb") as f:
+                    f.write(b"x" * 1024)
+                parts.append(path)
+                volume_callback(index, path)
+            return parts
+        finally:
+            self.finished.set()
+
+def test_uploads_every_volume_in_order(tmp_path):
+    async def upload(path):
+        await asyncio.sleep(0.01)
+        return f"link:{os.path.basename(path)}"
+
+    async def main():
+        pipeline = PackUploadPipeline(upload, max_pending=1, executor=FakeExecutor(5))
+        return await pipeline.run([], str(tmp_path), "archive")
+
+    uploaded = asyncio.run(main())
+    assert [index for index, _, _ in uploaded] == list(range(5))
+    assert uploaded[0][2] == "link:archive.7z.001"
+
+def test_failed_upload_stops_packing_and_removes_pending_volumes(tmp_path):
+    async def upload(path):
+        if path.endswith(".002"):
+            raise RuntimeError("upload failed")
+        return "link"
+
+    async def main():
+        executor = FakeExecutor(10)
+        pipeline = PackUploadPipeline(upload, max_pending=1, executor=executor)
+        with pytest.raises(RuntimeError, match="upload failed"):
+            await pipeline.run([], str(tmp_path), "archive")
+        assert executor.finished.is_set()
+
+    asyncio.run(main())
+    # Only the uploaded first volume is left
+    assert sorted(os.listdir(tmp_path)) == ["archive.7z.001"]
+
+def test_cancelled_run_releases_the_packing_thread(tmp_path):
+    async def main():
+        upload_started = asyncio.Event()
+
+        async def upload(path):
+            upload_started.set()
+            await asyncio.sleep(3600)
+
+        executor = FakeExecutor(10)
+        pipeline = PackUploadPipeline(upload, max_pending=1, executor=executor)
+        task = asyncio.create_task(pipeline.run([], str(tmp_path), "archive"))
+        await upload_started.wait()
+        # Let the packer fill the queue and block on it
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        deadline = time.monotonic() + 5
+        while not executor.finished.is_set() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        assert executor.finished.is_set()
+        # Cleanup runs once packing has stopped
+        await asyncio.gather(*PackUploadPipeline._cleanups)
+
+    asyncio.run(main())
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+import app.db.base as db_base
+from app.db.base import init_db, engine
+from app.db.models import FilesRegistry, TelegramStorage
+
+# What create_all produced before the migrations existed
+BASELINE_SCHEMA = [
+    "CREATE TABLE files_registry (id INTEGER NOT NULL, file_original_name VARCHAR NOT NULL, "
+    "file_size BIGINT NOT NULL, file_hash VARCHAR, category VARCHAR, created_at DATETIME, PRIMARY KEY (id))",
+    "CREATE UNIQUE INDEX ix_files_registry_file_hash ON files_registry (file_hash)",
+    "CREATE TABLE telegram_storage (id INTEGER NOT NULL, file_id INTEGER NOT NULL, "
+    "telegram_message_link VARCHAR NOT NULL, archive_obfuscated_name VARCHAR(40) NOT NULL, "
+    "is_parted BOOLEAN, part_number INTEGER, total_parts INTEGER, PRIMARY KEY (id), "
+    "FOREIGN KEY(file_id) REFERENCES files_registry (id))",
+]
+
+# The bulk lookups of TorrentManager._lookup_registry
+LOOKUPS = {
+    "ix_files_registry_name_size": (
+        select(FilesRegistry.file_original_name, FilesRegistry.file_size, FilesRegistry.id)
+        .where(FilesRegistry.file_original_name.in_(["a.nsp", "b.nsp"]))
+        .order_by(FilesRegistry.id)
+    ),
+    "ix_files_registry_title_version": (
+        select(FilesRegistry.title_id, FilesRegistry.version, FilesRegistry.file_size, FilesRegistry.id)
+        .where(FilesRegistry.title_id.in_(["0100000000010000", "0100000000010800"]))
+        .order_by(FilesRegistry.id)
+    ),
+    "ix_telegram_storage_file_id": (
+        select(TelegramStorage.file_id, TelegramStorage.telegram_message_link)
+        .where(TelegramStorage.file_id.in_([1, 2, 3]), TelegramStorage.total_parts.isnot(None))
+        .order_by(TelegramStorage.file_id, TelegramStorage.part_number)
+    ),
+}
+
+async def query_plan(conn, stmt):
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in (await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))).all()]
+
+def assert_index_search(plan, index):
+    # "SEARCH files_registry USING [COVERING] INDEX <index> (...)", never a full "SCAN files_registry"
+    assert any(step.startswith("SEARCH") and f"INDEX {index} " in step for step in plan), plan
+    assert not any(step.startswith("SCAN") for step in plan), plan
+
+@pytest.mark.parametrize("index", sorted(LOOKUPS))
+def test_lookup_uses_its_index(index):
+    async def main():
+        await init_db()
+        async with engine.connect() as conn:
+            return await query_plan(conn, LOOKUPS[index])
+
+    assert_index_search(asyncio.run(main()), index)
+
+def test_baseline_database_migrates_to_current_schema(tmp_path, monkeypatch):
+    old = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'baseline.db'}")
+    monkeypatch.setattr(db_base, "engine", old)
+
+    async def main():
+        async with old.begin() as conn:
+            for ddl in BASELINE_SCHEMA:
+                await conn.execute(text(ddl))
+            await conn.execute(text(
+                "INSERT INTO files_registry (id, file_original_name, file_size, category) VALUES "
+                "(1, 'Zelda [0100000000010000][v0].nsp', 100, 'Base'), (2, 'notes.txt', 5, 'Other')"
+            ))
+
+        version = await init_db()
+        # Running it again applies nothing
+        assert await init_db() == version
+
+        async with old.connect() as conn:
+            indexes = set((await conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))).scalars())
+            titles = (await conn.execute(text("SELECT id, title_id, version FROM files_registry ORDER BY id"))).all()
+            applied = (await conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))).scalars().all()
+            found = (await conn.execute(text(
+                "SELECT rowid FROM files_registry_fts WHERE files_registry_fts MATCH 'zelda'"
+            ))).scalars().all()
+            plans = {index: await query_plan(conn, stmt) for index, stmt in LOOKUPS.items()}
+        await old.dispose()
+        return version, indexes, titles, applied, found, plans
+
+    version, indexes, titles, applied, found, plans = asyncio.run(main())
+    assert version == 4
+    assert applied == [1, 2, 3, 4]
+    assert set(LOOKUPS) <= indexes
+    # Existing rows get their title id from the name
+    assert titles == [(1, "0100000000010000", 0), (2, None, None)]
+    assert found == [1]
+    for index, plan in plans.items():
+        assert_index_search(plan, index)
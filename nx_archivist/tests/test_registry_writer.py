@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+from sqlalchemy import select
+from app.bot.handlers.search import finalize_group
+from app.db.base import init_db, async_session
+from app.db.models import FilesRegistry
+from app.db.registry_writer import RegistryWriter
+
+@pytest.fixture(scope="module", autouse=True)
+def database():
+    asyncio.run(init_db())
+
+def counting_writer(batch_size, batch_delay=0.05):
+    """
+    RegistryWriter that records the size of every transaction it opens.
+    """
+    writer = RegistryWriter(batch_size=batch_size, batch_delay=batch_delay)
+    batches = []
+    execute = writer._execute
+
+    async def counted(batch):
+        batches.append(len(batch))
+        return await execute(batch)
+
+    writer._execute = counted
+    return writer, batches
+
+def insert(name):
+    async def write(session):
+        row = FilesRegistry(file_original_name=name, file_size=1, category="Other")
+        session.add(row)
+        await session.flush()
+        return row.id
+    return write
+
+def fail(session):
+    raise ValueError("bad row")
+
+async def stored(prefix):
+    async with async_session() as session:
+        result = await session.execute(
+            select(FilesRegistry.file_original_name)
+            .where(FilesRegistry.file_original_name.like(f"{prefix}%"))
+            .order_by(FilesRegistry.id)
+        )
+        return result.scalars().all()
+
+def test_writes_are_committed_in_batches_in_order():
+    writer, batches = counting_writer(batch_size=3)
+
+    async def main():
+        futures = [writer.submit(insert(f"batched{i}")) for i in range(7)]
+        ids = await asyncio.gather(*futures)
+        assert batches == [3, 3, 1]
+        await writer.close()
+        return ids
+
+    ids = asyncio.run(main())
+    assert ids == sorted(ids)
+    assert asyncio.run(stored("batched")) == [f"batched{i}" for i in range(7)]
+
+def test_failed_batch_is_retried_write_by_write():
+    writer, batches = counting_writer(batch_size=3)
+
+    async def main():
+        futures = [writer.submit(insert("retried0")), writer.submit(fail), writer.submit(insert("retried2"))]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        # The batch is rolled back as a whole, then each write gets its own transaction
+        assert batches == [3, 1, 1, 1]
+        await writer.close()
+        return results
+
+    first, failed, last = asyncio.run(main())
+    assert isinstance(failed, ValueError)
+    assert isinstance(first, int) and isinstance(last, int)
+    assert asyncio.run(stored("retried")) == ["retried0", "retried2"]
+
+def test_flush_and_close_wait_for_pending_writes():
+    writer, batches = counting_writer(batch_size=50, batch_delay=10)
+
+    async def main():
+        futures = [writer.submit(insert(f"flushed{i}")) for i in range(3)]
+        # Without flush the batch would wait for the delay or more writes
+        await asyncio.wait_for(writer.flush(), 1)
+        assert all(future.done() for future in futures)
+        later = writer.submit(insert("flushed3"))
+        await asyncio.wait_for(writer.close(), 1)
+        assert later.done() and writer._task is None
+        # Each flush closed the batch it joined
+        assert batches == [4, 2]
+        # Nothing pending: both are no-ops
+        await writer.flush()
+        await writer.close()
+
+    asyncio.run(main())
+    assert asyncio.run(stored("flushed")) == [f"flushed{i}" for i in range(4)]
+
+def test_group_without_registered_parts_is_not_finalized():
+    group = {"name": "Lost parts", "category": "Base", "entities": []}
+    record = {"size": 10, "file_id": None}
+
+    async def main():
+        async with async_session() as session:
+            await finalize_group(session, record, group, 10, "archive", [(0, "part0", "https://t.me/c/1/1")], {})
+
+    with pytest.raises(RuntimeError, match="not registered"):
+        asyncio.run(main())
@@ -0,0 +1,124 @@
+import os
+import time
+import asyncio
+import pytest
+from app.services.rutracker import RuTrackerService
+
+def slow_service(results, delay=0.1):
+    service = RuTrackerService()
+    calls = []
+
+    async def fetch_search(query, start=0):
+        calls.append((query, start))
+        await asyncio.sleep(delay)
+        return results
+
+    service._fetch_search = fetch_search
+    return service, calls
+
+def test_identical_searches_share_one_request():
+    service, calls = slow_service([{"id": "1"}])
+
+    async def main():
+        return await asyncio.gather(*(service.search("Zelda") for _ in range(5)))
+
+    assert asyncio.run(main()) == [[{"id": "1"}]] * 5
+    assert calls == [("zelda", 0)]
+    assert service.search_cache.coalesced == 4
+
+def test_cancelled_owner_does_not_cancel_the_waiters():
+    service, calls = slow_service([{"id": "1"}])
+
+    async def main():
+        owner = asyncio.create_task(service.search("Zelda"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(service.search("zelda"))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        return await waiter
+
+    assert asyncio.run(main()) == [{"id": "1"}]
+    assert len(calls) == 1
+    # The request finished on its own and is cached for the next search
+    assert service.search_cache.get("zelda") is not None
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def test_parse_search_results():
+    with open(os.path.join(FIXTURES, "tracker_search.html"), encoding="utf-8") as f:
+        results = RuTrackerService.parse_search_results(f.read())
+
+    # Text is joined like BeautifulSoup's get_text(strip=True), which the parser replaced
+    assert results == [
+        {
+            "title": "The Legend of Zelda: Tears of the Kingdom[NSP][RUS]",
+            "id": "6245869",
+            "size": "15.6 GB ↓",
+            "seeds": "152",
+            "updated": 1700000000,
+        },
+        {
+            # No data-topic_id: taken from the link, nested markup flattened
+            "title": "MarioKart 8 Deluxe [0100152000022000][v0]",
+            "id": "6300001",
+            "size": "812 MB",
+            "seeds": "0",
+            "updated": 0,
+        },
+    ]
+    assert RuTrackerService.size_bytes(results[0]["size"]) == int(15.6 * 1024 ** 3)
+
+def baseline_parse(html):
+    # RuTrackerService.search's BeautifulSoup parsing before the lxml parser
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "lxml")
+    results = []
+    for link in soup.find_all("a", class_="tLink"):
+        row = link.find_parent("tr")
+        if not row:
+            continue
+        cells = row.find_all("td")
+        if len(cells) < 10:
+            continue
+        topic_id = link.get("data-topic_id")
+        if not topic_id:
+            href = link.get("href", "")
+            if "t=" in href:
+                topic_id = href.split("t=")[-1]
+            else:
+                continue
+        results.append({
+            "title": link.get_text(strip=True),
+            "id": topic_id,
+            "size": cells[5].get_text(strip=True).replace("\xa0", " "),
+            "seeds": cells[6].get_text(strip=True)
+        })
+    return results
+
+def best_time(parse, html, repeat=20):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse(html)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+def test_parser_is_faster_than_beautifulsoup():
+    pytest.importorskip("bs4")
+    with open(os.path.join(FIXTURES, "tracker_search.html"), encoding="utf-8") as f:
+        html = f.read()
+    # A full results page: the recorded rows repeated up to 50 topics
+    head, rest = html.split("<tbody>")
+    rows, tail = rest.split("</tbody>")
+    page = f"{head}<tbody>{rows * (RuTrackerService.PAGE_SIZE // 2)}</tbody>{tail}"
+
+    results = RuTrackerService.parse_search_results(page)
+    assert len(results) == RuTrackerService.PAGE_SIZE
+    assert [{k: r[k] for k in ("title", "id", "size", "seeds")} for r in results] == baseline_parse(page)
+
+    lxml_ms = best_time(RuTrackerService.parse_search_results, page) * 1000
+    bs4_ms = best_time(baseline_parse, page) * 1000
+    print(f"tracker.php page of {len(results)} rows: lxml {lxml_ms:.2f} ms, BeautifulSoup {bs4_ms:.2f} ms")
+    assert lxml_ms < bs4_ms
@@ -0,0 +1,47 @@
+import asyncio
+import sqlite3
+import time
+from sqlalchemy import text
+from app.db.base import init_db, engine
+
+def test_pragmas_are_applied_on_connect():
+    async def main():
+        await init_db()
+        async with engine.connect() as conn:
+            return {
+                name: (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                for name in ("journal_mode", "synchronous", "mmap_size", "cache_size", "busy_timeout", "temp_store")
+            }
+
+    assert asyncio.run(main()) == {
+        "journal_mode": "wal",
+        "synchronous": 1,  # NORMAL
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "busy_timeout": 5000,
+        "temp_store": 2,  # MEMORY
+    }
+
+def test_readers_are_not_blocked_by_a_writer():
+    asyncio.run(init_db())
+    # An exclusive write transaction, as held while a commit is written out
+    writer = sqlite3.connect(engine.url.database, isolation_level=None)
+    writer.execute("BEGIN EXCLUSIVE")
+    writer.execute("INSERT INTO files_registry (file_original_name, file_size) VALUES ('uncommitted.nsp', 1)")
+
+    async def read():
+        async with engine.connect() as reader:
+            return (await reader.execute(text(
+                "SELECT count(*) FROM files_registry WHERE file_original_name = 'uncommitted.nsp'"
+            ))).scalar()
+
+    try:
+        started = time.perf_counter()
+        seen = asyncio.run(read())
+        elapsed = time.perf_counter() - started
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+    # With WAL the last committed snapshot is read right away instead of waiting out busy_timeout
+    assert seen == 0
+    assert elapsed < 1.0
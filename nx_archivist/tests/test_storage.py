@@ -0,0 +1,83 @@
+import asyncio
+import shutil
+from collections import namedtuple
+import pytest
+from app.core.config import config
+from app.utils.storage import StorageLedger
+
+DiskUsage = namedtuple("DiskUsage", "total used free")
+GB = 1024 ** 3
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    """
+    Ledger for an empty DOWNLOAD_DIR on a disk with 10 GB free and a 20 GB limit.
+    """
+    monkeypatch.setattr(shutil, "disk_usage", lambda path: DiskUsage(100 * GB, 90 * GB, 10 * GB))
+    ledger = StorageLedger(limit_bytes=20 * GB)
+    ledger.scan(str(tmp_path))
+    return ledger
+
+def test_resumed_file_is_counted_once(tmp_path):
+    # A sparse file of a resumed torrent already has its full length on disk
+    partial = tmp_path / "Release" / "game.nsp"
+    partial.parent.mkdir()
+    with open(partial, "wb") as f:
+        f.truncate(4096)
+    (tmp_path / "other.bin").write_bytes(b"x" * 100)
+
+    ledger = StorageLedger(limit_bytes=1024 ** 3)
+    assert ledger.scan(str(tmp_path)) == 4196
+    ledger.reservations["task"] = 2 * 8192
+
+    ledger.record_file("task", str(partial), 4096)
+    fresh = tmp_path / "Release" / "update.nsp"
+    fresh.write_bytes(b"u" * 4096)
+    ledger.record_file("task", str(fresh), 4096)
+
+    assert ledger.used == 4196 + 4096
+    # Both downloads consumed their share of the reservation
+    assert ledger.reservations["task"] == 8192
+
+    ledger.record_removal("task", str(partial))
+    assert ledger.used == 100 + 4096
+    assert ledger.scanned == {str(tmp_path / "other.bin"): 100}
+
+def test_reservations_queue_until_released(ledger):
+    async def main():
+        await ledger.reserve("first", 6 * GB)
+        assert ledger.usage() == {"used": 0, "reserved": 6 * GB, "limit": 20 * GB, "available": 14 * GB}
+        # Fits under the limit, but not on the disk next to the first task
+        assert not ledger.can_reserve(6 * GB)
+        second = asyncio.create_task(ledger.reserve("second", 6 * GB))
+        await asyncio.sleep(0.05)
+        assert not second.done()
+
+        ledger.record("first", GB)
+        assert ledger.reservations["first"] == 5 * GB
+        ledger.release("first")
+        await asyncio.wait_for(second, 1)
+        assert ledger.reservations == {"second": 6 * GB}
+
+    asyncio.run(main())
+
+def test_reservation_that_can_never_fit_fails_right_away(ledger, monkeypatch):
+    with pytest.raises(ValueError, match="MAX_STORAGE_GB"):
+        asyncio.run(ledger.reserve("huge", 21 * GB))
+
+    # 6 GB already written: the disk can only offer more if it is deleted after upload
+    ledger.record(None, 6 * GB)
+    monkeypatch.setattr(config, "DELETE_AFTER_UPLOAD", False)
+    with pytest.raises(ValueError, match="disk"):
+        asyncio.run(ledger.reserve("kept", 12 * GB))
+
+    monkeypatch.setattr(config, "DELETE_AFTER_UPLOAD", True)
+    async def main():
+        waiting = asyncio.create_task(ledger.reserve("cleaned", 12 * GB))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        waiting.cancel()
+    asyncio.run(main())
+    with pytest.raises(ValueError, match="disk"):
+        asyncio.run(ledger.reserve("cleaned", 17 * GB))
+    assert ledger.reservations == {}
@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+import libtorrent as lt
+import pytest
+from sqlalchemy import select
+import app.bot.handlers.search as search_handlers
+from app.core.config import config
+from app.core.tasks import task_manager, TaskStatus
+from app.core.torrent import TorrentManager
+from app.db.base import init_db, async_session
+from app.db.models import FilesRegistry
+
+def torrent_bytes(name, files):
+    piece_length = 16 * 1024
+    total = sum(size for _, size in files)
+    info = {
+        b"name": name.encode(),
+        b"piece length": piece_length,
+        b"pieces": b"\0" * 20 * (total // piece_length + 1),
+        b"files": [{b"length": size, b"path": path.encode().split(b"/")} for path, size in files],
+    }
+    return lt.bencode({b"info": info})
+
+@pytest.fixture
+def resume_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "RESUME_DIR", str(tmp_path / "resume"))
+    return tmp_path / "resume"
+
+def save_resume(manager, handle, save_path):
+    # What save_all_resume_data writes on shutdown, without waiting for the alert
+    params = lt.add_torrent_params()
+    params.ti = handle.torrent_file()
+    params.save_path = save_path
+    with open(manager._resume_path(manager._key(handle)), "wb") as f:
+        f.write(lt.write_resume_data_buf(params))
+
+def test_restored_torrents_stay_paused_until_a_task_claims_them(tmp_path, resume_dir):
+    data = torrent_bytes("Release", [("a.nsp", 40000), ("b.nsp", 50000)])
+    first = TorrentManager()
+    orphan = TorrentManager()
+    handle = asyncio.run(first.add_torrent(data, str(tmp_path)))
+    first.remember_task(handle, "123", 42, "Release")
+    save_resume(first, handle, str(tmp_path))
+    # Left behind without a task (e.g. by an older version): not restored, and cleaned up
+    other = asyncio.run(orphan.add_torrent(torrent_bytes("Other", [("c.nsp", 1000)]), str(tmp_path)))
+    save_resume(orphan, other, str(tmp_path))
+
+    manager = TorrentManager()
+    assert manager.restore_session() == [{"topic_id": "123", "chat_id": 42, "name": "Release"}]
+    handles = manager.ses.get_torrents()
+    assert [manager._key(h) for h in handles] == [manager._key(handle)]
+    flags = handles[0].flags()
+    assert flags & lt.torrent_flags.paused
+    assert not flags & lt.torrent_flags.auto_managed
+    assert not (resume_dir / f"{manager._key(other)}.fastresume").exists()
+
+    claimed = asyncio.run(manager.add_torrent(data, str(tmp_path)))
+    assert manager._key(claimed) == manager._key(handle)
+    # Priority changes are applied by the session thread
+    deadline = time.monotonic() + 5
+    while claimed.get_file_priorities() != [0, 0] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert claimed.get_file_priorities() == [0, 0]
+
+    # The task is over: nothing of it is kept for the next start
+    manager.release(claimed)
+    assert os.listdir(resume_dir) == []
+    assert manager.ses.get_torrents() == []
+
+def test_shutdown_saves_only_torrents_owned_by_a_task(tmp_path, resume_dir):
+    manager = TorrentManager()
+    owned = asyncio.run(manager.add_torrent(torrent_bytes("Owned", [("a.nsp", 1000)]), str(tmp_path)))
+    manager.remember_task(owned, "1", 42, "Owned")
+    # Only browsed in handle_select_release
+    browsed = asyncio.run(manager.add_torrent(torrent_bytes("Browsed", [("b.nsp", 1000)]), str(tmp_path)))
+    assert browsed.need_save_resume_data()
+
+    asyncio.run(manager.save_all_resume_data(timeout=5))
+    key = manager._key(owned)
+    assert sorted(os.listdir(resume_dir)) == [f"{key}.fastresume", f"{key}.task.json"]
+
+def test_late_resume_alert_does_not_rewrite_a_forgotten_torrent(tmp_path, resume_dir):
+    manager = TorrentManager()
+    handle = asyncio.run(manager.add_torrent(torrent_bytes("Done", [("a.nsp", 1000)]), str(tmp_path)))
+    manager.remember_task(handle, "1", 42, "Done")
+    manager._request_resume_save(handle)
+    manager.forget_resume_data(handle)
+
+    deadline = time.monotonic() + 5
+    while not manager._resume_saved and time.monotonic() < deadline:
+        manager.ses.wait_for_alert(200)
+        for alert in manager.ses.pop_alerts():
+            manager._handle_alert(alert)
+    assert manager._resume_saved == 1
+    assert os.listdir(resume_dir) == []
+
+PIECE_LENGTH = 16 * 1024
+
+class Seeder:
+    """
+    Local libtorrent session seeding a release whose files are written under `root`.
+    """
+
+    def __init__(self, root, name, files):
+        content = b""
+        for path, size in files:
+            data = hashlib.sha256(path.encode()).digest() * (size // 32 + 1)
+            full_path = os.path.join(root, name, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "wb") as f:
+                f.write(data[:size])
+            content += data[:size]
+        info = {
+            b"name": name.encode(),
+            b"piece length": PIECE_LENGTH,
+            b"pieces": b"".join(hashlib.sha1(content[i:i + PIECE_LENGTH]).digest() for i in range(0, len(content), PIECE_LENGTH)),
+            b"files": [{b"length": size, b"path": path.encode().split(b"/")} for path, size in files],
+        }
+        self.root = root
+        self.name = name
+        self.torrent = lt.bencode({b"info": info})
+        self.ses = lt.session({
+            "listen_interfaces": "127.0.0.1:0",
+            "enable_dht": False, "enable_lsd": False, "enable_upnp": False, "enable_natpmp": False,
+        })
+        params = lt.add_torrent_params()
+        params.ti = lt.torrent_info(lt.bdecode(self.torrent))
+        params.save_path = root
+        handle = self.ses.add_torrent(params)
+        deadline = time.monotonic() + 10
+        while not handle.status().is_seeding and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert handle.status().is_seeding
+
+    async def feed(self, handle):
+        # Peers are dropped while the download is paused, so keep offering ourselves
+        while True:
+            handle.connect_peer(("127.0.0.1", self.ses.listen_port()))
+            await asyncio.sleep(0.2)
+
+@pytest.fixture
+def seeder(tmp_path):
+    return Seeder(str(tmp_path / "seed"), "Release", [("a.nsp", 256 * 1024), ("b.nsp", 256 * 1024), ("c.nsp", 256 * 1024)])
+
+@pytest.fixture
+def manager(resume_dir):
+    manager = TorrentManager()
+    manager.ALERT_INTERVAL = 0.05
+    return manager
+
+async def stream(manager, handle, indices, seeder=None, priorities=None):
+    """
+    Collects (index, per-file progress at that moment) as iter_completed_files yields them.
+    """
+    feeding = asyncio.create_task(seeder.feed(handle)) if seeder else None
+    yielded = []
+    try:
+        async for idx in manager.iter_completed_files(handle, indices, priorities=priorities):
+            yielded.append((idx, handle.file_progress(flags=lt.torrent_handle.piece_granularity)))
+    finally:
+        if feeding:
+            feeding.cancel()
+    return yielded
+
+def test_files_are_yielded_as_they_complete_in_priority_order(tmp_path, seeder, manager):
+    async def main():
+        handle = await manager.add_torrent(seeder.torrent, str(tmp_path / "download"))
+        # Slow enough to see the files arrive one after another
+        handle.set_download_limit(512 * 1024)
+        return await asyncio.wait_for(stream(manager, handle, [0, 1, 2], seeder, priorities={0: 1, 1: 7, 2: 4}), 30)
+
+    yielded = asyncio.run(main())
+    assert [idx for idx, _ in yielded] == [1, 2, 0]
+    # The first file was handed over while the lowest priority one was still downloading
+    assert yielded[0][1][0] < 256 * 1024
+    assert manager.downloads == {}
+
+def test_files_already_on_disk_are_yielded_without_an_alert(tmp_path, seeder, manager):
+    download = tmp_path / "download"
+    os.makedirs(download / "Release")
+    shutil.copy(os.path.join(seeder.root, "Release", "b.nsp"), download / "Release" / "b.nsp")
+
+    async def main():
+        handle = await manager.add_torrent(seeder.torrent, str(download))
+        # The data found on disk is hashed when the torrent is added
+        deadline = time.monotonic() + 10
+        while handle.status().state in (lt.torrent_status.checking_files, lt.torrent_status.checking_resume_data) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        files = manager.iter_completed_files(handle, [0, 1])
+        # No peer yet: only the file on disk can be complete
+        first = await asyncio.wait_for(files.__anext__(), 5)
+        feeding = asyncio.create_task(seeder.feed(handle))
+        try:
+            rest = [idx async for idx in files]
+        finally:
+            feeding.cancel()
+        return [first] + rest
+
+    assert asyncio.run(main()) == [1, 0]
+
+def test_torrent_errors_end_the_stream(tmp_path, seeder, manager):
+    download = tmp_path / "download"
+    download.mkdir()
+    # The release folder cannot be created
+    (download / "Release").write_bytes(b"")
+
+    async def main():
+        handle = await manager.add_torrent(seeder.torrent, str(download))
+        return await asyncio.wait_for(stream(manager, handle, [0, 1, 2], seeder), 30)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(main())
+    assert manager.downloads == {}
+
+class FakeTracker:
+    def __init__(self, torrent):
+        self.torrent = torrent
+
+    async def get_torrent_file(self, topic_id):
+        return self.torrent
+
+async def feed_when_added(manager, seeder):
+    while not manager.ses.get_torrents():
+        await asyncio.sleep(0.05)
+    await seeder.feed(manager.ses.get_torrents()[0])
+
+def test_download_task_packs_and_registers_each_group(tmp_path, seeder, manager, monkeypatch):
+    asyncio.run(init_db())
+    uploads = []
+
+    async def upload_file(path, caption=None, task_id=None):
+        uploads.append(os.path.basename(path))
+        return f"https://t.me/c/9/{len(uploads)}"
+
+    # process_download_task imports main, which opens bot.log in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "DOWNLOAD_DIR", str(tmp_path / "download"))
+    monkeypatch.setattr(search_handlers, "torrent_manager", manager)
+    monkeypatch.setattr(search_handlers, "rutracker", FakeTracker(seeder.torrent))
+    monkeypatch.setattr(search_handlers.uploader, "upload_file", upload_file)
+    task_id = task_manager.create_task("Release")
+
+    async def main():
+        feeding = asyncio.create_task(feed_when_added(manager, seeder))
+        try:
+            await asyncio.wait_for(search_handlers.process_download_task(task_id, "555", 42), 60)
+        finally:
+            feeding.cancel()
+
+    asyncio.run(main())
+    task = task_manager.get_task(task_id)
+    assert task.status == TaskStatus.COMPLETED, task.error
+    # One archive per file, each registered with its link
+    assert len(uploads) == 3
+
+    async def rows():
+        async with async_session() as session:
+            return (await session.execute(
+                select(FilesRegistry.file_original_name).where(FilesRegistry.file_original_name.like("Release/%"))
+            )).scalars().all()
+    assert sorted(asyncio.run(rows())) == ["Release/a.nsp", "Release/b.nsp", "Release/c.nsp"]
+    # Released: nothing is kept for a restart
+    assert manager.ses.get_torrents() == []
+    assert os.listdir(config.RESUME_DIR) == []
@@ -0,0 +1,196 @@
+import asyncio
+import importlib.util
+import threading
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import httpcore
+import httpx
+import pytest
+from app.core.config import config
+from app.services.transport import TokenBucket, TrackerTransport, tracker_proxy
+
+URL = "https://rutracker.org/forum/tracker.php"
+
+def make_client(answers, retries=3, rate_limiter=None):
+    """
+    Client over a TrackerTransport whose network side replays `answers`
+    (status codes, (status, headers) pairs or exceptions to raise).
+    """
+    calls = []
+
+    def handler(request):
+        calls.append(time.monotonic())
+        answer = answers[min(len(calls), len(answers)) - 1]
+        if isinstance(answer, Exception):
+            raise answer
+        status, headers = answer if isinstance(answer, tuple) else (answer, {})
+        return httpx.Response(status, headers=headers, text="ok")
+
+    transport = TrackerTransport(
+        retries=retries,
+        rate_limiter=rate_limiter or TokenBucket(0, 1),
+        inner=httpx.MockTransport(handler)
+    )
+    transport.BACKOFF_BASE = 0.001
+    return httpx.AsyncClient(transport=transport), transport, calls
+
+def get(client):
+    async def main():
+        async with client:
+            return await client.get(URL)
+    return asyncio.run(main())
+
+def test_requests_are_throttled():
+    client, _, calls = make_client([200], rate_limiter=TokenBucket(20, 1))
+
+    async def main():
+        async with client:
+            return await asyncio.gather(*(client.get(URL) for _ in range(5)))
+
+    responses = asyncio.run(main())
+    assert [r.status_code for r in responses] == [200] * 5
+    # One token up front, then one every 50 ms
+    assert calls[-1] - calls[0] >= 0.19
+
+def test_server_errors_are_retried_with_backoff():
+    client, transport, calls = make_client([503, 502, 200])
+    assert get(client).status_code == 200
+    assert len(calls) == 3
+    assert transport.latency.stats()["tracker.php"]["retries"] == 2
+
+def test_last_answer_is_returned_when_retries_run_out():
+    client, _, calls = make_client([503], retries=2)
+    assert get(client).status_code == 503
+    assert len(calls) == 3
+
+def test_timeouts_are_retried_then_raised():
+    client, _, calls = make_client([httpx.ConnectTimeout("slow"), 200])
+    assert get(client).status_code == 200
+
+    client, _, calls = make_client([httpx.ReadTimeout("slow")], retries=1)
+    with pytest.raises(httpx.ReadTimeout):
+        get(client)
+    assert len(calls) == 2
+
+def test_retry_after_is_honoured():
+    client, _, calls = make_client([(429, {"Retry-After": "1"}), 200])
+    assert get(client).status_code == 200
+    # The backoff alone would retry within milliseconds
+    assert calls[1] - calls[0] >= 1.0
+
+def test_long_retry_after_goes_back_to_the_caller():
+    client, _, calls = make_client([(503, {"Retry-After": "3600"}), 200])
+    assert get(client).status_code == 503
+    assert len(calls) == 1
+
+def test_retry_after_formats():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    date = httpx.Response(503, headers={"Retry-After": format_datetime(when, usegmt=True)})
+    assert 28 <= TrackerTransport.retry_after(date) <= 30
+    assert TrackerTransport.retry_after(httpx.Response(503, headers={"Retry-After": "7"})) == 7.0
+    assert TrackerTransport.retry_after(httpx.Response(503, headers={"Retry-After": "soon"})) is None
+    assert TrackerTransport.retry_after(httpx.Response(503)) is None
+
+def test_proxy_comes_from_the_environment_or_the_setting(monkeypatch):
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "NO_PROXY", "http_proxy", "https_proxy", "all_proxy", "no_proxy"):
+        monkeypatch.delenv(name, raising=False)
+    assert tracker_proxy(URL) is None
+
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.local:3128")
+    assert tracker_proxy(URL) == "http://proxy.local:3128"
+    monkeypatch.setenv("NO_PROXY", "rutracker.org")
+    assert tracker_proxy(URL) is None
+
+    monkeypatch.setattr(config, "RUTRACKER_PROXY", "http://other.local:8080")
+    assert tracker_proxy(URL) == "http://other.local:8080"
+
+    # The proxy ends up in the pool that carries the requests
+    transport = TrackerTransport(proxy=tracker_proxy(URL))
+    assert isinstance(transport._inner._pool, httpcore.AsyncHTTPProxy)
+    assert not isinstance(TrackerTransport()._inner._pool, httpcore.AsyncHTTPProxy)
+
+class Recorder:
+    """
+    Server side of the local-server tests: counts hits per path, the client ports seen
+    and the most requests handled at once.
+    """
+
+    def __init__(self, answers=None, delay=0.0):
+        self.answers = answers or {}
+        self.delay = delay
+        self.hits = {}
+        self.ports = set()
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        path = request.path.split("?")[0]
+        with self._lock:
+            hit = self.hits[path] = self.hits.get(path, 0) + 1
+            self.ports.add(request.client_address[1])
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay)
+            answers = self.answers.get(path, [200])
+            return answers[min(hit, len(answers)) - 1], {}, f"hit {hit}"
+        finally:
+            with self._lock:
+                self.active -= 1
+
+def server_client(base_url, timeout=5.0, **kwargs):
+    transport = TrackerTransport(rate_limiter=TokenBucket(0, 1), proxy=None, **kwargs)
+    transport.BACKOFF_BASE = 0.001
+    return httpx.AsyncClient(base_url=base_url, transport=transport, timeout=timeout), transport
+
+def test_connections_are_pooled_and_kept_alive(local_server, monkeypatch):
+    monkeypatch.setattr(config, "RUTRACKER_MAX_CONNECTIONS", 2)
+    recorder = Recorder(delay=0.1)
+    client, _ = server_client(local_server(recorder))
+
+    async def main():
+        async with client:
+            parallel = await asyncio.gather(*(client.get("tracker.php") for _ in range(6)))
+            sequential = [await client.get("dl.php") for _ in range(3)]
+        return parallel + sequential
+
+    responses = asyncio.run(main())
+    assert [r.status_code for r in responses] == [200] * 9
+    # Never more than the pool allows, and the same two sockets carry all nine requests
+    assert recorder.peak == 2
+    assert len(recorder.ports) == 2
+
+def test_server_errors_and_timeouts_are_retried_over_the_network(local_server):
+    recorder = Recorder({"/tracker.php": [503, 502, 200]})
+    client, transport = server_client(local_server(recorder))
+
+    async def main():
+        async with client:
+            return await client.get("tracker.php")
+
+    response = asyncio.run(main())
+    assert response.status_code == 200 and response.text == "hit 3"
+    assert transport.latency.stats()["tracker.php"]["retries"] == 2
+
+    slow = Recorder(delay=0.5)
+    client, transport = server_client(local_server(slow), timeout=0.1, retries=1)
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(main())
+    assert slow.hits["/tracker.php"] == 2
+    assert transport.latency.stats()["tracker.php"]["errors"] == 2
+
+def test_http2_falls_back_to_http1_without_h2(local_server, caplog):
+    client, _ = server_client(local_server(Recorder()), http2=True)
+
+    async def main():
+        async with client:
+            return await client.get("tracker.php")
+
+    response = asyncio.run(main())
+    assert response.status_code == 200
+    # Plain-text HTTP/2 is never negotiated, so a local server always speaks HTTP/1.1
+    assert response.http_version == "HTTP/1.1"
+    if importlib.util.find_spec("h2") is None:
+        assert "h2 package is not installed" in caplog.text